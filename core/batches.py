@@ -0,0 +1,216 @@
+import io
+import json
+from datetime import datetime, timezone as dt_timezone
+from logging import getLogger
+
+from django.conf import settings
+
+from .models import Post, ProviderBatch, Remixable, SitemapURL, Story
+from .tasks import (
+    anthropic_client, client, generate_images_for_remixables, match_stories, post_content_params,
+    remixable_post_params, save_post, url_to_source_name,
+)
+
+logger = getLogger(__name__)
+
+# Requests per submitted job, well under both providers' per-batch limits
+BATCH_MAX_REQUESTS = 5000
+
+ANTHROPIC_FINISHED = {'ended'}
+AZURE_FINISHED = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+def _in_flight_items(kind: str) -> dict:
+    """custom_id -> item for every request of this kind in a batch that hasn't finished."""
+    items = {}
+    for batch in ProviderBatch.objects.filter(kind=kind, finished_at__isnull=True):
+        items.update(batch.items)
+    return items
+
+
+def _chunks(items: list, size: int = BATCH_MAX_REQUESTS):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _finish(batch: ProviderBatch, succeeded: int, failed: int):
+    batch.succeeded = succeeded
+    batch.failed = failed
+    batch.finished_at = datetime.now(dt_timezone.utc)
+    batch.save()
+    logger.info(f"Batch {batch}: {succeeded} applied, {failed} failed")
+    print(f"Batch {batch.batch_id}: {succeeded} applied, {failed} failed")
+
+
+# Remixable posts: Anthropic Message Batches
+
+def submit_remixable_batches() -> list:
+    """Submit every remixable without a post that isn't already in a running batch."""
+    in_flight = _in_flight_items('remixable_post')
+    pending = Remixable.objects.filter(remixed_as__isnull=True, markdown_blob__isnull=False).exclude(
+        id__in=[item['remixable_id'] for item in in_flight.values()]
+    ).select_related('markdown_blob').only('id', 'url', 'markdown_blob__data')
+    batches = []
+    for chunk in _chunks(list(pending)):
+        requests = [
+            {
+                'custom_id': f'remixable-{remixable.id}',
+                'params': remixable_post_params(remixable.markdown_content, url_to_source_name(remixable.url)),
+            }
+            for remixable in chunk
+        ]
+        response = anthropic_client.beta.messages.batches.create(requests=requests)
+        batches.append(ProviderBatch.objects.create(
+            provider='anthropic',
+            kind='remixable_post',
+            batch_id=response.id,
+            status=response.processing_status,
+            items={f'remixable-{remixable.id}': {'remixable_id': remixable.id} for remixable in chunk},
+        ))
+        print(f"Submitted {len(requests)} remixables as Anthropic batch {response.id}")
+    return batches
+
+
+def apply_remixable_batch(batch: ProviderBatch, images: bool = True):
+    succeeded = failed = 0
+    applied = []
+    for entry in anthropic_client.beta.messages.batches.results(batch.batch_id):
+        item = batch.items.get(entry.custom_id)
+        if item is None:
+            continue
+        if entry.result.type != 'succeeded':
+            logger.error(f"Batch {batch.batch_id}: {entry.custom_id} {entry.result.type}")
+            failed += 1
+            continue
+        remixable = Remixable.objects.filter(id=item['remixable_id'], remixed_as__isnull=True).first()
+        if remixable is None:
+            continue
+        remixable.remixed_as = entry.result.message.content[0].text
+        remixable.save()
+        applied.append(remixable)
+        succeeded += 1
+    _finish(batch, succeeded, failed)
+    if images and applied:
+        generate_images_for_remixables(applied)
+
+
+def poll_remixable_batch(batch: ProviderBatch, images: bool = True):
+    response = anthropic_client.beta.messages.batches.retrieve(batch.batch_id)
+    batch.status = response.processing_status
+    batch.save(update_fields=['status', 'updated_at'])
+    if batch.status in ANTHROPIC_FINISHED:
+        apply_remixable_batch(batch, images)
+
+
+# Story posts: Azure OpenAI Batch API
+
+def submit_post_batches() -> list:
+    """
+    Match every story without a post that isn't already in a running batch, then
+    submit post generation for the matched stories. Matching stays synchronous:
+    it's a small, cheap model call and decides which page each post links to.
+    """
+    in_flight = _in_flight_items('post_content')
+    stories = list(Story.objects.filter(post__isnull=True).exclude(
+        id__in=[item['story_id'] for item in in_flight.values()]
+    ))
+    if not stories:
+        return []
+    matches = match_stories(stories)
+    pages = SitemapURL.objects.in_bulk([page_id for _, page_id in matches])
+    matches = [(story, pages[page_id]) for story, page_id in matches if page_id in pages]
+
+    batches = []
+    for chunk in _chunks(matches):
+        lines = []
+        for story, sitemap_url in chunk:
+            body = post_content_params(story, sitemap_url)
+            body['model'] = settings.AZURE_OPENAI_BATCH_DEPLOYMENT
+            lines.append(json.dumps({
+                'custom_id': f'story-{story.id}',
+                'method': 'POST',
+                'url': '/chat/completions',
+                'body': body,
+            }))
+        input_file = client.files.create(
+            file=('post_content.jsonl', io.BytesIO('\n'.join(lines).encode('utf-8'))),
+            purpose='batch',
+        )
+        response = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/chat/completions',
+            completion_window='24h',
+        )
+        batches.append(ProviderBatch.objects.create(
+            provider='azure_openai',
+            kind='post_content',
+            batch_id=response.id,
+            status=response.status,
+            items={
+                f'story-{story.id}': {'story_id': story.id, 'sitemap_url_id': sitemap_url.id}
+                for story, sitemap_url in chunk
+            },
+        ))
+        print(f"Submitted {len(lines)} posts as Azure OpenAI batch {response.id}")
+    return batches
+
+
+def _file_lines(file_id: str | None) -> list:
+    return client.files.content(file_id).text.splitlines() if file_id else []
+
+
+def apply_post_batch(batch: ProviderBatch, output_file_id: str | None, error_file_id: str | None = None):
+    """
+    Save the posts in the output file. Requests Azure rejected are in the error file,
+    and requests a failed or expired batch never ran are in neither; both count as failed.
+    """
+    succeeded = failed = 0
+    seen = set()
+    for line in _file_lines(output_file_id) + _file_lines(error_file_id):
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        item = batch.items.get(result.get('custom_id'))
+        if item is None:
+            continue
+        seen.add(result['custom_id'])
+        response = result.get('response') or {}
+        if result.get('error') or response.get('status_code') != 200:
+            logger.error(f"Batch {batch.batch_id}: {result.get('custom_id')} failed: {result.get('error') or response}")
+            failed += 1
+            continue
+        story = Story.objects.filter(id=item['story_id']).first()
+        sitemap_url = SitemapURL.objects.filter(id=item['sitemap_url_id']).first()
+        if story is None or sitemap_url is None or Post.objects.filter(story=story).exists():
+            continue
+        save_post(story, sitemap_url, response['body']['choices'][0]['message']['content'])
+        succeeded += 1
+    missing = [custom_id for custom_id in batch.items if custom_id not in seen]
+    if missing:
+        logger.error(f"Batch {batch.batch_id} ({batch.status}): no result for {len(missing)} requests")
+        failed += len(missing)
+    _finish(batch, succeeded, failed)
+
+
+def poll_post_batch(batch: ProviderBatch):
+    response = client.batches.retrieve(batch.batch_id)
+    batch.status = response.status
+    batch.save(update_fields=['status', 'updated_at'])
+    if batch.status in AZURE_FINISHED:
+        apply_post_batch(batch, response.output_file_id, response.error_file_id)
+
+
+def poll_batches(kind: str | None = None, images: bool = True):
+    """Check every unfinished batch and apply the results of those the provider has finished."""
+    batches = ProviderBatch.objects.filter(finished_at__isnull=True)
+    if kind:
+        batches = batches.filter(kind=kind)
+    for batch in batches:
+        try:
+            if batch.provider == 'anthropic':
+                poll_remixable_batch(batch, images)
+            else:
+                poll_post_batch(batch)
+        except Exception as e:
+            logger.error(f"Error polling batch {batch.batch_id}: {str(e)}")
+        print(f"Batch {batch.batch_id} ({batch.kind}): {batch.status}")
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from logging import getLogger
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+# requests_cache patches requests.Session globally; crawls manage their own freshness
+from requests_cache.patcher import OriginalSession
+from urllib3.util.retry import Retry
+
+logger = getLogger(__name__)
+
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "16"))
+# Politeness: requests in flight per host, and minimum gap between request starts to a host
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "2"))
+CRAWL_HOST_DELAY = float(os.getenv("CRAWL_HOST_DELAY", "0.25"))
+# (connect, read) timeouts in seconds
+CRAWL_TIMEOUT = (5, 20)
+CRAWL_USER_AGENT = 'Mozilla/5.0 (compatible; MyBot/1.0)'
+
+
+class _Host:
+    def __init__(self, concurrency: int):
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+
+class Crawler:
+    """
+    Concurrent HTTP fetcher. Each worker thread keeps its own pooled keep-alive
+    session; requests per host are capped and spaced out, and connection errors,
+    429s and 5xx responses are retried with exponential backoff.
+    """
+
+    def __init__(self, max_workers: int = CRAWL_WORKERS, per_host: int = CRAWL_PER_HOST,
+                 host_delay: float = CRAWL_HOST_DELAY, timeout: tuple = CRAWL_TIMEOUT, retries: int = 3):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.host_delay = host_delay
+        self.timeout = timeout
+        self.retries = retries
+        self._local = threading.local()
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def session(self) -> OriginalSession:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = OriginalSession()
+            retry = Retry(
+                total=self.retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({'GET', 'HEAD'}),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(max_retries=retry, pool_connections=32, pool_maxsize=self.per_host)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = CRAWL_USER_AGENT
+            self._local.session = session
+        return session
+
+    @contextmanager
+    def _host_slot(self, url: str):
+        host = urlparse(url).netloc
+        with self._hosts_lock:
+            state = self._hosts.setdefault(host, _Host(self.per_host))
+        with state.slots:
+            with state.lock:
+                now = time.monotonic()
+                wait = state.next_start - now
+                state.next_start = max(now, state.next_start) + self.host_delay
+            if wait > 0:
+                time.sleep(wait)
+            yield
+
+    def fetch(self, url: str, headers: dict | None = None):
+        """GET a URL politely. Returns the response, or None if it could not be fetched."""
+        try:
+            with self._host_slot(url):
+                response = self.session().get(url, headers=headers, timeout=self.timeout)
+        except Exception as e:
+            logger.error(f"Error fetching {url}: {str(e)}")
+            return None
+        if response.status_code >= 400:
+            logger.error(f"Error fetching {url}: HTTP {response.status_code}")
+            return None
+        return response
+
+    def map(self, func, items):
+        """Run func over items on the worker pool, yielding (item, result) as each finishes."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(func, item): item for item in items}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Error crawling {futures[future]}: {str(e)}")
+                    result = None
+                yield futures[future], result
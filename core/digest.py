@@ -0,0 +1,141 @@
+import hashlib
+import math
+import re
+from collections import Counter
+from logging import getLogger
+
+from django.conf import settings
+from django.db import transaction
+
+from .blobs import decompress
+from .fingerprint import normalize_text
+from .models import SitemapURL
+from .retrieval import matchable_pages, tokenize
+
+logger = getLogger(__name__)
+
+# Bump when the extraction changes so every stored digest is recomputed
+DIGEST_VERSION = 1
+# A segment found on at least this share of pages (and BOILERPLATE_MIN_PAGES) is site chrome
+BOILERPLATE_MIN_SHARE = 0.2
+BOILERPLATE_MIN_PAGES = 3
+MIN_SEGMENT_WORDS = 5
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=["“\'(\[]?[A-Z0-9])')
+
+
+def split_segments(content: str | None) -> list:
+    """Lines of the crawled body text, split further into sentences."""
+    segments = []
+    for line in (content or '').splitlines():
+        for sentence in _SENTENCE_END.split(line):
+            sentence = ' '.join(sentence.split())
+            if sentence:
+                segments.append(sentence)
+    return segments
+
+
+def segment_key(segment: str) -> int:
+    return int.from_bytes(hashlib.blake2b(normalize_text(segment).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def looks_like_chrome(segment: str) -> bool:
+    """Too short to be prose, or a run of Title Case link labels like a menu."""
+    words = segment.split()
+    if len(words) < MIN_SEGMENT_WORDS:
+        return True
+    capitalized = sum(1 for word in words if word[:1].isupper())
+    return capitalized / len(words) > 0.7 and segment[-1] not in '.!?:'
+
+
+def content_hash(content: str | None) -> str:
+    return hashlib.sha1(f"{DIGEST_VERSION}\0{content or ''}".encode('utf-8')).hexdigest()
+
+
+def find_boilerplate(contents) -> frozenset:
+    """Keys of segments repeated across many pages: navigation, footers, cookie banners."""
+    page_counts = Counter()
+    pages = 0
+    for content in contents:
+        pages += 1
+        page_counts.update({segment_key(segment) for segment in split_segments(content)})
+    min_pages = max(BOILERPLATE_MIN_PAGES, math.ceil(pages * BOILERPLATE_MIN_SHARE))
+    return frozenset(key for key, count in page_counts.items() if count >= min_pages)
+
+
+def make_digest(title: str | None, meta_desc: str | None, content: str | None,
+                boilerplate: frozenset = frozenset(), max_chars: int = None) -> str:
+    """
+    Extractive digest of a page: boilerplate is dropped, then the highest scoring
+    sentences are kept in page order until max_chars. A sentence scores by how
+    frequent its terms are on the page, boosted for terms in the title or meta
+    description and for appearing early.
+    """
+    max_chars = max_chars or settings.PAGE_DIGEST_MAX_CHARS
+    segments = []
+    seen = set()
+    for segment in split_segments(content):
+        key = segment_key(segment)
+        if key in boilerplate or key in seen or looks_like_chrome(segment):
+            continue
+        seen.add(key)
+        segments.append(segment)
+    if sum(len(segment) + 1 for segment in segments) <= max_chars:
+        return ' '.join(segments)
+
+    segment_terms = [tokenize(segment) for segment in segments]
+    frequency = Counter(term for terms in segment_terms for term in terms)
+    topic_terms = set(tokenize(f"{title or ''} {meta_desc or ''}"))
+    scores = []
+    for position, terms in enumerate(segment_terms):
+        if not terms:
+            scores.append(0.0)
+            continue
+        weight = sum(math.log(1 + frequency[term]) * (2 if term in topic_terms else 1) for term in set(terms))
+        scores.append(weight / math.sqrt(len(terms)) / (1 + position / 20))
+
+    chosen = []
+    used = 0
+    for index in sorted(range(len(segments)), key=lambda i: -scores[i]):
+        if used + len(segments[index]) + 1 > max_chars:
+            continue
+        chosen.append(index)
+        used += len(segments[index]) + 1
+    return ' '.join(segments[index] for index in sorted(chosen))
+
+
+def update_page_digests() -> int:
+    """
+    Recompute the digest of every matchable page whose content changed since its
+    digest was built. Returns the number of digests written.
+    """
+    pages = matchable_pages()
+    stale = [
+        page_id
+        for page_id, data, digest_hash in pages.values_list('id', 'content_blob__data', 'digest_hash').iterator(chunk_size=500)
+        if digest_hash != content_hash(decompress(data))
+    ]
+    if not stale:
+        return 0
+    boilerplate = find_boilerplate(
+        decompress(data) for data in pages.values_list('content_blob__data', flat=True).iterator(chunk_size=500)
+    )
+
+    for start in range(0, len(stale), 500):
+        rows = pages.filter(id__in=stale[start:start + 500]).values_list('id', 'title', 'meta_desc', 'content_blob__data')
+        with transaction.atomic():
+            for page_id, title, meta_desc, data in rows:
+                content = decompress(data)
+                SitemapURL.objects.filter(id=page_id).update(
+                    digest=make_digest(title, meta_desc, content, boilerplate),
+                    digest_hash=content_hash(content),
+                )
+    logger.info(f"Page digests: {len(stale)} updated, {len(boilerplate)} boilerplate segments")
+    return len(stale)
+
+
+def page_digest(sitemap_url: SitemapURL) -> str:
+    """The stored digest if it's current, otherwise one built on the fly from this page alone."""
+    if sitemap_url.digest is not None and sitemap_url.digest_hash == content_hash(sitemap_url.content):
+        return sitemap_url.digest
+    return make_digest(sitemap_url.title, sitemap_url.meta_desc, sitemap_url.content)
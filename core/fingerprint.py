@@ -0,0 +1,76 @@
+import hashlib
+import re
+import unicodedata
+
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+# Fingerprints this many bits apart or closer count as near-duplicates.
+# Must stay below BANDS so a match is guaranteed to share at least one band.
+MAX_DISTANCE = 3
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents and punctuation, and collapse whitespace."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    return ' '.join(text.split())
+
+
+def _shingles(words: list, size: int = 3) -> list:
+    if len(words) <= size:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word 3-gram shingles of the normalized text."""
+    weights = [0] * FINGERPRINT_BITS
+    for shingle in _shingles(normalize_text(text).split()):
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def story_fingerprint(title: str, description: str | None) -> int:
+    """
+    Fingerprint of a story's title and description, as a signed 64-bit integer
+    so it fits in a BigIntegerField.
+    """
+    value = simhash(f"{title or ''} {description or ''}")
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
+
+
+class SimHashIndex:
+    """
+    In-memory near-duplicate lookup. Fingerprints are bucketed by each 16-bit band;
+    any two within MAX_DISTANCE bits must share a band, so only bucket-mates are compared.
+    """
+
+    def __init__(self, fingerprints=()):
+        self._buckets = [{} for _ in range(BANDS)]
+        for fingerprint in fingerprints:
+            self.add(fingerprint)
+
+    @staticmethod
+    def _bands(fingerprint: int):
+        unsigned = fingerprint & ((1 << 64) - 1)
+        for band in range(BANDS):
+            yield band, unsigned >> (band * BAND_BITS) & ((1 << BAND_BITS) - 1)
+
+    def add(self, fingerprint: int):
+        for band, key in self._bands(fingerprint):
+            self._buckets[band].setdefault(key, []).append(fingerprint)
+
+    def find_near_duplicate(self, fingerprint: int, max_distance: int = MAX_DISTANCE) -> int | None:
+        for band, key in self._bands(fingerprint):
+            for candidate in self._buckets[band].get(key, ()):
+                if hamming_distance(fingerprint, candidate) <= max_distance:
+                    return candidate
+        return None
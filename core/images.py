@@ -0,0 +1,118 @@
+import hashlib
+import io
+import tempfile
+from logging import getLogger
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from PIL import Image
+
+from .models import PosterImage
+
+logger = getLogger(__name__)
+
+# Widths of the pre-sized renditions; the remixed list shows images at most 768px wide
+VARIANT_WIDTHS = (320, 640, 1024)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Downloads stay in memory up to this size, then spill to a temp file
+SPOOL_MAX_BYTES = 2 * 1024 * 1024
+
+
+def find_poster(poster_text: str) -> PosterImage | None:
+    """An already rendered poster with this text, so the model doesn't need to run again."""
+    if not poster_text:
+        return None
+    return PosterImage.objects.filter(poster_text__iexact=poster_text.strip()).order_by('id').first()
+
+
+def _spool(chunks) -> tuple:
+    """Write byte chunks to a spooled temp file, hashing as they arrive. Returns (file, sha256)."""
+    digest = hashlib.sha256()
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    for chunk in chunks:
+        digest.update(chunk)
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled, digest.hexdigest()
+
+
+def make_variants(source, name_prefix: str) -> tuple:
+    """
+    Save WebP and JPEG renditions of the image at each width in VARIANT_WIDTHS no larger
+    than the original. Returns ({"<width>.<format>": storage name}, width, height).
+    """
+    with Image.open(source) as image:
+        image.load()
+        width, height = image.size
+        rgb = image.convert('RGB')
+    variants = {}
+    for target in sorted({w for w in VARIANT_WIDTHS if w < width} | {min(width, max(VARIANT_WIDTHS))}):
+        resized = rgb if target == width else rgb.resize((target, round(height * target / width)), Image.LANCZOS)
+        for extension, (image_format, options) in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            variants[f'{target}.{extension}'] = default_storage.save(
+                f'{name_prefix}-{target}.{extension}', ContentFile(buffer.getvalue())
+            )
+    return variants, width, height
+
+
+def save_poster(poster_text: str, chunks, extension: str = 'png') -> PosterImage:
+    """
+    Store a rendered poster from an iterable of byte chunks without holding it all in memory.
+    Identical bytes are stored once: a poster with the same content hash is returned instead.
+    """
+    spooled, content_hash = _spool(chunks)
+    with spooled:
+        existing = PosterImage.objects.filter(content_hash=content_hash).first()
+        if existing is not None:
+            return existing
+        name_prefix = f'posters/{content_hash[:16]}'
+        image_name = default_storage.save(f'{name_prefix}.{extension}', File(spooled))
+        spooled.seek(0)
+        variants, width, height = make_variants(spooled, name_prefix)
+    return _create_poster(
+        [image_name, *variants.values()],
+        poster_text=poster_text.strip(),
+        content_hash=content_hash,
+        image=image_name,
+        variants=variants,
+        width=width,
+        height=height,
+    )
+
+
+def _create_poster(stored_names: list, **fields) -> PosterImage:
+    try:
+        with transaction.atomic():
+            return PosterImage.objects.create(**fields)
+    except IntegrityError:
+        # Another worker stored the same image first; drop our copies
+        for name in stored_names:
+            default_storage.delete(name)
+        return PosterImage.objects.get(content_hash=fields['content_hash'])
+
+
+def poster_from_file(name: str) -> PosterImage:
+    """Register an image already in storage, e.g. one saved before posters were deduplicated."""
+    with default_storage.open(name, 'rb') as f:
+        spooled, content_hash = _spool(iter(lambda: f.read(64 * 1024), b''))
+    with spooled:
+        existing = PosterImage.objects.filter(content_hash=content_hash).first()
+        if existing is not None:
+            return existing
+        variants, width, height = make_variants(spooled, f'posters/{content_hash[:16]}')
+    return _create_poster(
+        list(variants.values()),
+        poster_text='',
+        content_hash=content_hash,
+        image=name,
+        variants=variants,
+        width=width,
+        height=height,
+    )
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from logging import getLogger
+
+from django.conf import settings
+
+logger = getLogger(__name__)
+
+
+class LLMCache:
+    """
+    Content-addressed cache of LLM responses in a standalone SQLite file.
+    Entries are keyed on a hash of the request (model, messages and parameters),
+    expire after `ttl` seconds and are evicted least-recently-used beyond `max_entries`.
+    """
+
+    def __init__(self, path, ttl: int, max_entries: int):
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        with self._lock:
+            self._connection().executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    call_site TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+                CREATE TABLE IF NOT EXISTS counters (
+                    call_site TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(params: dict) -> str:
+        payload = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _count(self, call_site: str, column: str):
+        self._connection().execute(
+            f"INSERT INTO counters (call_site, {column}) VALUES (?, 1) "
+            f"ON CONFLICT(call_site) DO UPDATE SET {column} = {column} + 1",
+            (call_site,)
+        )
+
+    def get(self, call_site: str, key: str) -> str | None:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (self.ttl and now - row[1] > self.ttl):
+            self._count(call_site, 'misses')
+            return None
+        conn.execute(
+            "UPDATE responses SET accessed_at = ?, hit_count = hit_count + 1 WHERE key = ?",
+            (now, key)
+        )
+        self._count(call_site, 'hits')
+        return row[0]
+
+    def set(self, call_site: str, key: str, response: str):
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO responses (key, call_site, response, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, call_site, response, now, now)
+        )
+        with self._lock:
+            self._writes_since_evict += 1
+            should_evict = self._writes_since_evict >= 100
+            if should_evict:
+                self._writes_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Drop expired entries, then the least recently used ones beyond max_entries.
+        """
+        conn = self._connection()
+        removed = 0
+        if self.ttl:
+            removed += conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+        if self.max_entries:
+            removed += conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+        return removed
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM responses")
+        conn.execute("DELETE FROM counters")
+
+    def stats(self) -> dict:
+        """
+        Per call site: cached entries plus lifetime hit/miss counts.
+        """
+        conn = self._connection()
+        stats = {}
+        for call_site, hits, misses in conn.execute("SELECT call_site, hits, misses FROM counters"):
+            stats[call_site] = {'entries': 0, 'hits': hits, 'misses': misses}
+        for call_site, entries in conn.execute("SELECT call_site, COUNT(*) FROM responses GROUP BY call_site"):
+            stats.setdefault(call_site, {'entries': 0, 'hits': 0, 'misses': 0})['entries'] = entries
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                settings.LLM_CACHE_PATH,
+                ttl=settings.LLM_CACHE_TTL,
+                max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            )
+    return _cache
+
+
+def cached_response(call_site: str, params: dict, fetch, parse=None):
+    """
+    Return the response for these request params, from the cache or by calling fetch().
+    With parse, the parsed response is returned instead, and a response is only cached
+    once parse accepts it (returns something other than None), so a malformed reply is
+    fetched again next time rather than replayed until it expires. Only call sites listed
+    in settings.LLM_CACHE_SITES are cached.
+    """
+    if parse is None:
+        parse = _unparsed
+    if call_site not in settings.LLM_CACHE_SITES:
+        return parse(fetch())
+
+    cache = get_llm_cache()
+    key = cache.make_key(params)
+    response = cache.get(call_site, key)
+    if response is not None:
+        parsed = parse(response)
+        if parsed is not None:
+            logger.debug(f"LLM cache hit for {call_site}")
+            return parsed
+        # Cached before its call site validated replies; fetch a fresh one
+
+    response = fetch()
+    parsed = parse(response) if response is not None else None
+    if parsed is not None:
+        cache.set(call_site, key, response)
+    return parsed
+
+
+def _unparsed(response):
+    return response
+
+
+def log_cache_stats():
+    if not settings.LLM_CACHE_SITES:
+        return
+    for call_site, counts in sorted(get_llm_cache().stats().items()):
+        logger.info(f"LLM cache {call_site}: {counts['hits']} hits, {counts['misses']} misses, {counts['entries']} entries")
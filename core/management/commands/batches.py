@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from core.batches import poll_batches
+from core.models import ProviderBatch
+
+class Command(BaseCommand):
+    help = 'Lists unfinished provider batch jobs and applies the results of any that have finished'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-images',
+            action='store_true',
+            help='Skip poster image generation for remixables applied from a batch',
+        )
+
+    def handle(self, *args, **kwargs):
+        if not ProviderBatch.objects.filter(finished_at__isnull=True).exists():
+            self.stdout.write('No unfinished batches')
+            return
+        poll_batches(images=not kwargs['no_images'])
+        for batch in ProviderBatch.objects.filter(finished_at__isnull=True):
+            self.stdout.write(f'{batch.kind} {batch.batch_id}: {batch.status}, {len(batch.items)} requests')
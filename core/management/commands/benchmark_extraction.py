@@ -0,0 +1,83 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from markdownify import markdownify as md
+
+from core.models import Remixable
+from core.scrapers import parse_llm_example
+
+
+def soup_extraction(html_content: str) -> dict:
+    """The extraction parse_llm_example replaced: BeautifulSoup for metadata, the whole page to markdown."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, "html.parser")
+    og_title = soup.find("meta", property="og:title")
+    image_urls = [img.get('src') for img in soup.find_all('img') if (img.get('src') or '').startswith(('http://', 'https://'))]
+    return {
+        "title": og_title["content"] if og_title else None,
+        "markdown_content": md(html_content),
+        "image_urls": image_urls,
+    }
+
+
+def time_extraction(extract, pages: list, repeat: int) -> tuple:
+    """(ms per page, total markdown chars) of extract over pages, best of repeat runs."""
+    extract(pages[0])
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [extract(page) for page in pages]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(pages) * 1000, sum(len(result['markdown_content']) for result in results)
+
+
+class Command(BaseCommand):
+    help = ('Compares parse time and markdown size of parse_llm_example against the BeautifulSoup '
+            'extraction it replaced, over the HTML stored for crawled examples or a directory of saved pages')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory',
+            nargs='?',
+            help='Directory of saved .html pages to use instead of stored examples',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=50,
+            help='Most recently crawled examples to use (default: 50)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timed runs per extraction; the fastest is reported (default: 5)',
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['directory']:
+            pages = [path.read_text() for path in sorted(Path(kwargs['directory']).glob('*.html'))]
+            origin = kwargs['directory']
+        else:
+            remixables = Remixable.objects.filter(html_blob__isnull=False).order_by('-updated_at')[:kwargs['limit']]
+            pages = [remixable.html_content for remixable in remixables]
+            origin = 'stored examples'
+        if not pages:
+            self.stdout.write(f'No pages found in {origin}; crawl examples with `manage.py scrape` first')
+            return
+
+        self.stdout.write(f'{len(pages)} pages from {origin}, {sum(map(len, pages)) / len(pages) / 1000:.1f} KB each on average')
+        results = {}
+        for name, extract in (('beautifulsoup', soup_extraction), ('lxml', parse_llm_example)):
+            results[name] = time_extraction(extract, pages, max(kwargs['repeat'], 1))
+            ms, chars = results[name]
+            self.stdout.write(f'{name}: {ms:.1f} ms/page, {chars / len(pages):.0f} markdown chars/page')
+
+        (old_ms, old_chars), (new_ms, new_chars) = results['beautifulsoup'], results['lxml']
+        size_change = (new_chars - old_chars) / old_chars if old_chars else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{old_ms / new_ms:.1f}x faster, markdown {size_change:+.0%}'
+        ))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from core.models import Post
+from core.retrieval import get_sitemap_index, shortlist_pages, update_sitemap_index
+from core.vector_store import story_vector
+
+class Command(BaseCommand):
+    help = 'Reports recall@k of the local sitemap shortlist against the pages chosen for existing posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--k',
+            type=int,
+            nargs='+',
+            default=[1, 5, 10, 20, 50],
+            help='Shortlist sizes to report (default: 1 5 10 20 50)',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Rebuild the index before evaluating',
+        )
+
+    def handle(self, *args, **kwargs):
+        index = update_sitemap_index() if kwargs['rebuild'] else get_sitemap_index()
+        indexed = set(index.doc_ids.tolist())
+        max_k = max(kwargs['k'])
+
+        ranks = {'bm25': [], 'bm25+vectors': []}
+        posts = Post.objects.select_related('story').only('sitemap_url_id', 'story__title', 'story__description')
+        for post in posts:
+            if post.sitemap_url_id not in indexed:
+                continue
+            text = f"{post.story.title}\n{post.story.description or ''}"
+            rankings = {
+                'bm25': shortlist_pages(text, max_k),
+                'bm25+vectors': shortlist_pages(text, max_k, query_vector=story_vector(post.story)),
+            }
+            for mode, candidates in rankings.items():
+                ranks[mode].append(candidates.index(post.sitemap_url_id) + 1 if post.sitemap_url_id in candidates else None)
+
+        if not ranks['bm25']:
+            self.stdout.write('No posts link to indexed pages yet')
+            return
+        self.stdout.write(f"{len(ranks['bm25'])} posts evaluated against {len(index)} indexed pages")
+        for mode, mode_ranks in ranks.items():
+            for k in sorted(kwargs['k']):
+                hits = sum(rank is not None and rank <= k for rank in mode_ranks)
+                self.stdout.write(f'{mode} recall@{k}: {hits / len(mode_ranks):.3f} ({hits}/{len(mode_ranks)})')
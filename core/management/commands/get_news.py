@@ -1,8 +1,16 @@
 from django.core.management.base import BaseCommand
-from core.tasks import get_stories, process_stories
+from core.tasks import NEWSDATA_MAX_PAGES, ingest_stories
 
 class Command(BaseCommand):
     help = 'Get news stories'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-pages',
+            type=int,
+            default=NEWSDATA_MAX_PAGES,
+            help=f'Maximum number of NewsData pages to fetch (default: {NEWSDATA_MAX_PAGES})',
+        )
+
     def handle(self, *args, **kwargs):
-        process_stories(get_stories())
+        ingest_stories(max_pages=kwargs['max_pages'])
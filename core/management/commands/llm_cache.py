@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from core.llm_cache import get_llm_cache
+
+class Command(BaseCommand):
+    help = 'Shows LLM response cache statistics, optionally evicting or clearing entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evict',
+            action='store_true',
+            help='Remove expired entries and trim the cache to LLM_CACHE_MAX_ENTRIES',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Remove all cached responses and reset counters',
+        )
+
+    def handle(self, *args, **kwargs):
+        cache = get_llm_cache()
+        if kwargs['clear']:
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS('Cleared LLM cache'))
+        elif kwargs['evict']:
+            removed = cache.evict()
+            self.stdout.write(self.style.SUCCESS(f'Evicted {removed} entries'))
+
+        for call_site, counts in sorted(cache.stats().items()):
+            self.stdout.write(
+                f"{call_site}: {counts['entries']} entries, {counts['hits']} hits, {counts['misses']} misses"
+            )
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.blobs import content_store_stats, delete_unreferenced_blobs
+
+
+def _mb(size: int) -> str:
+    return f'{size / 1e6:.1f} MB'
+
+
+class Command(BaseCommand):
+    help = ('Moves page text into the compressed content store (applying pending core migrations), '
+            'drops unreferenced blobs, vacuums the database and reports the space saved')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-vacuum',
+            action='store_true',
+            help="Skip VACUUM, which rewrites the whole database file and needs as much free disk again",
+        )
+
+    def handle(self, *args, **kwargs):
+        path = Path(connection.settings_dict['NAME'])
+        before = path.stat().st_size if path.exists() else 0
+
+        call_command('migrate', 'core', verbosity=1)
+        deleted = delete_unreferenced_blobs()
+        self.stdout.write(f'{deleted} unreferenced blobs deleted')
+        if not kwargs['no_vacuum']:
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+        stats = content_store_stats()
+        self.stdout.write(
+            f"{stats['references']} texts stored as {stats['blobs']} blobs: "
+            f"{_mb(stats['text_bytes'])} of text, {_mb(stats['distinct_bytes'])} distinct, "
+            f"{_mb(stats['stored_bytes'])} compressed"
+        )
+        after = path.stat().st_size
+        self.stdout.write(self.style.SUCCESS(
+            f'Database file {_mb(before)} -> {_mb(after)} ({_mb(before - after)} saved)'
+        ))
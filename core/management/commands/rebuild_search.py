@@ -0,0 +1,21 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from core.search import rebuild_search_indexes, run_sql_script
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search indexes over stories, sitemap pages and remixables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sql',
+            help=("Run the SQL statements in this file first. Use it for hand-written writes to pages and "
+                  "remixables: their search triggers call blob_text(), which the sqlite3 shell doesn't have"),
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['sql']:
+            run_sql_script(Path(kwargs['sql']).read_text())
+            self.stdout.write(f"Ran {kwargs['sql']}")
+        rebuild_search_indexes()
+        self.stdout.write(self.style.SUCCESS('Search indexes rebuilt'))
@@ -1,9 +1,18 @@
-from core.tasks import generate_post_for_all_stories, get_stories, process_stories, sync_sitemap
+from core.tasks import generate_post_for_all_stories, ingest_stories, sync_sitemap
+from core.llm_cache import log_cache_stats
+from core.batches import poll_batches, submit_post_batches
 from django.core.management.base import BaseCommand
 
 class Command(BaseCommand):
     help = 'Runs the relevant page finder, post creator and post content generator'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Apply finished Azure OpenAI batches, then submit posts for all pending stories as a new batch instead of generating live',
+        )
+
     def handle(self, *args, **kwargs):
         # First sync the sitemap
         self.stdout.write('Syncing sitemap...')
@@ -11,5 +20,10 @@ class Command(BaseCommand):
         
         # Then process stories and generate posts
         self.stdout.write('Processing stories...')
-        process_stories(get_stories())
-        generate_post_for_all_stories()
\ No newline at end of file
+        ingest_stories()
+        if kwargs['batch']:
+            poll_batches('post_content')
+            submit_post_batches()
+        else:
+            generate_post_for_all_stories()
+        log_cache_stats()
@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from core.scrapers import crawl_llm_examples
 from core.tasks import generate_posts_for_all_remixables
+from core.llm_cache import log_cache_stats
+from core.batches import poll_batches, submit_remixable_batches
 
 class Command(BaseCommand):
     help = 'Run the crawl_llm_examples function from scrapers.py'
@@ -11,21 +13,38 @@ class Command(BaseCommand):
             action='store_true',
             help='Skip the crawling step and only generate posts',
         )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-crawl every listing page and example instead of only new or changed ones',
+        )
         parser.add_argument(
             '--generate',
             type=int,
             default=2,
             help='Number of posts to generate per remixable (default: 2)',
         )
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Apply finished Anthropic batches, then submit every pending remixable as a new batch instead of generating live',
+        )
 
     def handle(self, *args, **kwargs):
         if not kwargs['skip_crawl']:
             self.stdout.write(self.style.SUCCESS('Starting the crawl_llm_examples function...'))
-            crawl_llm_examples()
+            crawl_llm_examples(full=kwargs['full'])
             self.stdout.write(self.style.SUCCESS('Finished running the crawl_llm_examples function.'))
         else:
             self.stdout.write(self.style.SUCCESS('Skipping crawl step...'))
 
+        if kwargs['batch']:
+            poll_batches('remixable_post')
+            submit_remixable_batches()
+            log_cache_stats()
+            return
+
         self.stdout.write(self.style.SUCCESS('Starting the generate_posts_for_all_remixables function...'))
         generate_posts_for_all_remixables(limit=kwargs['generate'])
         self.stdout.write(self.style.SUCCESS('Finished running the generate_posts_for_all_remixables function.'))
+        log_cache_stats()
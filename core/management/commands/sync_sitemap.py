@@ -4,5 +4,16 @@ from core.tasks import sync_sitemap
 class Command(BaseCommand):
     help = 'Syncs the sitemap'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-crawl every recent URL, not just new or changed ones',
+        )
+
     def handle(self, *args, **kwargs):
-        sync_sitemap()
+        summary = sync_sitemap(full=kwargs['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['new']} new, {summary['changed']} changed, "
+            f"{summary['unchanged']} unchanged, {summary['removed']} removed"
+        ))
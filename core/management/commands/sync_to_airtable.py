@@ -4,7 +4,17 @@ from core.scrapers import sync_remixables_to_airtable
 class Command(BaseCommand):
     help = 'Syncs Remixables with remixed content to Airtable'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Push every remixable, not only those changed since the last sync',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Starting sync to Airtable...')
-        sync_remixables_to_airtable()
-        self.stdout.write(self.style.SUCCESS('Successfully synced to Airtable')) 
\ No newline at end of file
+        summary = sync_remixables_to_airtable(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully synced to Airtable: {summary['created']} created, {summary['updated']} updated, "
+            f"{summary['failed']} failed, {summary['requests']} requests"
+        )) 
\ No newline at end of file
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from core.models import Story
+from core.vector_store import sync_sitemap_vectors, sync_story_vectors
+
+class Command(BaseCommand):
+    help = 'Brings the SitemapURL and Story vector stores up to date, embedding only changed rows'
+
+    def handle(self, *args, **kwargs):
+        written, deleted = sync_sitemap_vectors()
+        self.stdout.write(f'Sitemap vectors: {written} written, {deleted} deleted')
+
+        written = 0
+        stories = Story.objects.only('id', 'title', 'description').order_by('id')
+        batch = []
+        for story in stories.iterator(chunk_size=500):
+            batch.append(story)
+            if len(batch) == 500:
+                written += sync_story_vectors(batch)
+                batch = []
+        written += sync_story_vectors(batch)
+        self.stdout.write(self.style.SUCCESS(f'Story vectors: {written} written'))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from core.digest import update_page_digests
+
+class Command(BaseCommand):
+    help = 'Builds boilerplate-free digests for sitemap pages whose content changed'
+
+    def handle(self, *args, **kwargs):
+        updated = update_page_digests()
+        self.stdout.write(self.style.SUCCESS(f'{updated} page digests updated'))
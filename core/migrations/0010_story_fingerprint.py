@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+from core.fingerprint import story_fingerprint
+
+
+def backfill_fingerprints(apps, schema_editor):
+    Story = apps.get_model('core', 'Story')
+    stories = list(Story.objects.only('id', 'title', 'description'))
+    for story in stories:
+        story.fingerprint = story_fingerprint(story.title, story.description)
+    Story.objects.bulk_update(stories, ['fingerprint'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_remixable_remixed_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='fingerprint',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_feedcursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelevanceJudgement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article_id', models.CharField(max_length=100, unique=True)),
+                ('title', models.CharField(max_length=500)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('score', models.IntegerField()),
+                ('reason', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_relevancejudgement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitemapurl',
+            name='removed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:09
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def delete_duplicate_posts(apps, schema_editor):
+    # Keep the first post generated for each story
+    Post = apps.get_model('core', 'Post')
+    keep = Post.objects.values('story_id').annotate(first_id=Min('id')).values_list('first_id', flat=True)
+    Post.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_sitemapurl_removed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_posts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='post',
+            constraint=models.UniqueConstraint(fields=('story',), name='unique_post_per_story'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+
+def fts_sql(table, columns):
+    """
+    External-content FTS5 index over `table`, kept in sync by triggers, so rows
+    written with bulk_create or update() are indexed as well as save().
+    """
+    fts = f"{table}_fts"
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f"new.{column}" for column in columns)
+    old_values = ', '.join(f"old.{column}" for column in columns)
+    forward = [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({column_list}, content='{table}', content_rowid='id', "
+        f"tokenize='porter unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END",
+        # Only re-index when an indexed column changes, not on every status update
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {column_list} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+    reverse = [
+        f"DROP TRIGGER IF EXISTS {fts}_update",
+        f"DROP TRIGGER IF EXISTS {fts}_delete",
+        f"DROP TRIGGER IF EXISTS {fts}_insert",
+        f"DROP TABLE IF EXISTS {fts}",
+    ]
+    return migrations.RunSQL(forward, reverse)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_unique_post_per_story'),
+    ]
+
+    operations = [
+        fts_sql('core_story', ['title', 'description']),
+        fts_sql('core_sitemapurl', ['title', 'meta_desc', 'content']),
+        fts_sql('core_remixable', ['title', 'markdown_content']),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitemapurl',
+            name='digest',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sitemapurl',
+            name='digest_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_sitemapurl_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('anthropic', 'Anthropic Message Batches'), ('azure_openai', 'Azure OpenAI Batch')], max_length=20)),
+                ('kind', models.CharField(max_length=50)),
+                ('batch_id', models.CharField(max_length=200, unique=True)),
+                ('status', models.CharField(max_length=50)),
+                ('items', models.JSONField(default=dict)),
+                ('succeeded', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_providerbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosterImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('poster_text', models.CharField(blank=True, db_index=True, max_length=200)),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('image', models.FileField(upload_to='posters/')),
+                ('variants', models.JSONField(default=dict)),
+                ('width', models.IntegerField()),
+                ('height', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='remixable',
+            name='poster',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='remixables', to='core.posterimage'),
+        ),
+    ]
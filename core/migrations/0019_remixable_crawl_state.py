@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_posterimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remixable',
+            name='etag',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='remixable',
+            name='last_modified',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='remixable',
+            name='listing_lastmod',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='remixable',
+            name='listing_url',
+            field=models.URLField(blank=True, db_index=True, null=True),
+        ),
+    ]
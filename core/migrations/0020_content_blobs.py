@@ -0,0 +1,182 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:33
+
+import hashlib
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# (model, old text field, new blob field)
+MOVED_FIELDS = [
+    ('SitemapURL', 'content', 'content_blob'),
+    ('Remixable', 'html_content', 'html_blob'),
+    ('Remixable', 'markdown_content', 'markdown_blob'),
+]
+
+# (table, indexed columns, blob backed columns) for the search indexes of migration 0015
+SEARCH_INDEXES = [
+    ('core_sitemapurl', ['title', 'meta_desc', 'content'], {'content': 'content_blob_id'}),
+    ('core_remixable', ['title', 'markdown_content'], {'markdown_content': 'markdown_blob_id'}),
+]
+
+
+def move_text_to_blobs(apps, schema_editor):
+    """Compress every stored text into a ContentBlob, one blob per distinct text."""
+    ContentBlob = apps.get_model('core', 'ContentBlob')
+    for model_name, text_field, blob_field in MOVED_FIELDS:
+        Model = apps.get_model('core', model_name)
+        texts = Model.objects.exclude(**{f'{text_field}__isnull': True}).exclude(**{text_field: ''})
+        ids = list(texts.values_list('id', flat=True))
+        for start in range(0, len(ids), 500):
+            chunk = list(Model.objects.filter(id__in=ids[start:start + 500]).values_list('id', text_field))
+            by_hash = {}
+            for _, text in chunk:
+                encoded = text.encode('utf-8')
+                by_hash.setdefault(hashlib.sha256(encoded).hexdigest(), encoded)
+            known = set(ContentBlob.objects.filter(hash__in=list(by_hash)).values_list('hash', flat=True))
+            new = [
+                ContentBlob(hash=blob_hash, data=zlib.compress(encoded, 6), size=len(encoded))
+                for blob_hash, encoded in by_hash.items() if blob_hash not in known
+            ]
+            ContentBlob.objects.bulk_create(new)
+            blob_ids = dict(ContentBlob.objects.filter(hash__in=list(by_hash)).values_list('hash', 'id'))
+            for row_id, text in chunk:
+                Model.objects.filter(id=row_id).update(**{
+                    f'{blob_field}_id': blob_ids[hashlib.sha256(text.encode('utf-8')).hexdigest()]
+                })
+
+
+def restore_text_from_blobs(apps, schema_editor):
+    ContentBlob = apps.get_model('core', 'ContentBlob')
+    for model_name, text_field, blob_field in MOVED_FIELDS:
+        Model = apps.get_model('core', model_name)
+        for row_id, blob_id in Model.objects.filter(**{f'{blob_field}__isnull': False}).values_list('id', f'{blob_field}_id'):
+            data = ContentBlob.objects.filter(id=blob_id).values_list('data', flat=True).get()
+            Model.objects.filter(id=row_id).update(**{text_field: zlib.decompress(data).decode('utf-8')})
+
+
+def drop_search_triggers(table):
+    return [f"DROP TRIGGER IF EXISTS {table}_fts_{event}" for event in ('update', 'delete', 'insert')]
+
+
+def inline_search_sql(table, columns):
+    """The search index of migration 0015: external content read straight from the table."""
+    fts = f"{table}_fts"
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f"new.{column}" for column in columns)
+    old_values = ', '.join(f"old.{column}" for column in columns)
+    return drop_search_triggers(table) + [
+        f"DROP TABLE IF EXISTS {fts}",
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({column_list}, content='{table}', content_rowid='id', "
+        f"tokenize='porter unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {column_list} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def blob_search_sql(table, columns, blob_columns):
+    """
+    The search index reading blob backed columns through a view that decompresses
+    them with blob_text(), registered on Django's connections by core.blobs.
+    The triggers call it too, so after this migration clients without the function,
+    like the sqlite3 shell, can't insert or delete rows in these tables; see core.search.
+    """
+    fts = f"{table}_fts"
+    view = f"{table}_text"
+    column_list = ', '.join(columns)
+
+    def values(row):
+        return ', '.join(
+            f"(SELECT blob_text(data) FROM core_contentblob WHERE id = {row}.{blob_columns[column]})"
+            if column in blob_columns else f"{row}.{column}"
+            for column in columns
+        )
+
+    view_columns = ', '.join(
+        f"blob_text(b_{column}.data) AS {column}" if column in blob_columns else f"t.{column}"
+        for column in columns
+    )
+    joins = ' '.join(
+        f"LEFT JOIN core_contentblob b_{column} ON b_{column}.id = t.{blob_column}"
+        for column, blob_column in blob_columns.items()
+    )
+    watched = ', '.join(blob_columns.get(column, column) for column in columns)
+    forward = [
+        f"DROP TABLE IF EXISTS {fts}",
+        f"CREATE VIEW {view} AS SELECT t.id, {view_columns} FROM {table} t {joins}",
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({column_list}, content='{view}', content_rowid='id', "
+        f"tokenize='porter unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {values('new')}); END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {values('old')}); END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {watched} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {values('old')}); "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {values('new')}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+    reverse = drop_search_triggers(table) + [f"DROP TABLE IF EXISTS {fts}", f"DROP VIEW IF EXISTS {view}"]
+    return forward, reverse
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_remixable_crawl_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64, unique=True)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='remixable',
+            name='html_blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.contentblob'),
+        ),
+        migrations.AddField(
+            model_name='remixable',
+            name='markdown_blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.contentblob'),
+        ),
+        migrations.AddField(
+            model_name='sitemapurl',
+            name='content_blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.contentblob'),
+        ),
+        # The old triggers read the text columns, which are about to go
+        *[
+            migrations.RunSQL(drop_search_triggers(table), inline_search_sql(table, columns))
+            for table, columns, _ in SEARCH_INDEXES
+        ],
+        migrations.RunPython(move_text_to_blobs, restore_text_from_blobs),
+        migrations.RemoveField(
+            model_name='remixable',
+            name='html_content',
+        ),
+        migrations.RemoveField(
+            model_name='remixable',
+            name='markdown_content',
+        ),
+        migrations.RemoveField(
+            model_name='sitemapurl',
+            name='content',
+        ),
+        *[
+            migrations.RunSQL(*blob_search_sql(table, columns, blob_columns))
+            for table, columns, blob_columns in SEARCH_INDEXES
+        ],
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_content_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remixable',
+            name='airtable_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='remixable',
+            name='airtable_id',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
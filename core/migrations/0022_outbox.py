@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+def outbox_sql(table, model, columns):
+    """
+    Triggers recording every insert and delete on `table` in the outbox, and every update
+    that changes one of `columns`. Bookkeeping writes like sync hashes aren't recorded.
+    """
+    now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    changed = ' OR '.join(f"old.{column} IS NOT new.{column}" for column in columns)
+    insert = f"INSERT INTO core_outboxentry(model, object_id, action, created_at) VALUES ('{model}', "
+    forward = [
+        f"CREATE TRIGGER {table}_outbox_insert AFTER INSERT ON {table} BEGIN "
+        f"{insert}new.id, 'upsert', {now}); END",
+        f"CREATE TRIGGER {table}_outbox_update AFTER UPDATE ON {table} WHEN {changed} BEGIN "
+        f"{insert}new.id, 'upsert', {now}); END",
+        f"CREATE TRIGGER {table}_outbox_delete AFTER DELETE ON {table} BEGIN "
+        f"{insert}old.id, 'delete', {now}); END",
+    ]
+    reverse = [f"DROP TRIGGER IF EXISTS {table}_outbox_{event}" for event in ('insert', 'update', 'delete')]
+    return migrations.RunSQL(forward, reverse)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_remixable_airtable_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(max_length=100, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OutboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        outbox_sql('core_remixable', 'remixable', [
+            'url', 'is_video', 'title', 'remixed_as', 'remixed_image', 'poster_id', 'html_blob_id', 'markdown_blob_id',
+        ]),
+        outbox_sql('core_post', 'post', ['sitemap_url_id', 'story_id', 'content']),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relevancejudgement',
+            name='audit',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+
+from .blobs import compress, decompress, text_hash
 
 
 class Source(models.Model):
@@ -46,6 +48,8 @@ class Story(models.Model):
     duplicate = models.BooleanField(default=False)
     relevance_score = models.IntegerField()
     relevance_reason = models.TextField()
+    # SimHash of the normalized title and description, for near-duplicate detection
+    fingerprint = models.BigIntegerField(null=True, blank=True, db_index=True)
 
     # Relationships
     source = models.ForeignKey(Source, on_delete=models.CASCADE)
@@ -60,14 +64,211 @@ class Story(models.Model):
         verbose_name_plural = "Stories"
 
 
-class SitemapURL(models.Model):
+class RelevanceJudgement(models.Model):
+    """Every LLM relevance score, kept or not, as training data for the local pre-filter."""
+    article_id = models.CharField(max_length=100, unique=True)
+    title = models.CharField(max_length=500)
+    description = models.TextField(null=True, blank=True)
+    score = models.IntegerField()
+    reason = models.TextField(blank=True)
+    # Scored although the pre-filter rejected it: an unbiased sample of the filter's rejects
+    audit = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.score}: {self.title}"
+
+
+class FeedCursor(models.Model):
+    """Ingestion progress for a paginated news feed."""
+    name = models.CharField(max_length=100, unique=True)
+    # pubDate of the newest story fetched so far
+    watermark = models.DateTimeField(null=True, blank=True)
+    # nextPage token of an unfinished walk back to backfill_until
+    next_page = models.CharField(max_length=200, null=True, blank=True)
+    backfill_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class OutboxEntry(models.Model):
+    """
+    A change to a row that external targets export, e.g. Airtable. Entries are written
+    by database triggers (migration 0022), so bulk writes and update() are recorded
+    too, and read in id order by each target from its OutboxCursor.
+    """
+    ACTION_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+    # Lower-case model name, e.g. remixable or post
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.action} {self.model} {self.object_id}"
+
+
+class OutboxCursor(models.Model):
+    """Export progress of one target through the outbox: every entry up to position is delivered."""
+    target = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.target} @ {self.position}"
+
+
+class ProviderBatch(models.Model):
+    """An offline batch job submitted to an LLM provider, polled until its results are applied."""
+    PROVIDER_CHOICES = [
+        ('anthropic', 'Anthropic Message Batches'),
+        ('azure_openai', 'Azure OpenAI Batch'),
+    ]
+    provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES)
+    # Call site the batch generates for, e.g. remixable_post or post_content
+    kind = models.CharField(max_length=50)
+    batch_id = models.CharField(max_length=200, unique=True)
+    # Provider-reported status, e.g. in_progress, ended, completed
+    status = models.CharField(max_length=50)
+    # custom_id -> ids needed to apply that request's result
+    items = models.JSONField(default=dict)
+    succeeded = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set once results have been applied, or the batch ended without any
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.batch_id} ({self.status})"
+
+
+class ContentBlob(models.Model):
+    """
+    Compressed page text, stored once per distinct content and shared by every
+    row holding it. Rows reference blobs through compressed_text attributes.
+    """
+    hash = models.CharField(max_length=64, unique=True)
+    data = models.BinaryField()
+    # Uncompressed size in bytes
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.hash
+
+    @property
+    def text(self) -> str:
+        return decompress(self.data)
+
+    @classmethod
+    def store(cls, text: str | None) -> 'ContentBlob | None':
+        """The blob holding this text, created if it's new. Empty text isn't stored."""
+        if not text:
+            return None
+        blob, _ = cls.objects.get_or_create(
+            hash=text_hash(text),
+            defaults={'data': lambda: compress(text), 'size': len(text.encode('utf-8'))},
+        )
+        return blob
+
+    @classmethod
+    def store_many(cls, texts) -> dict:
+        """Store each distinct non-empty text once, compressing only new ones. Returns {hash: blob id}."""
+        by_hash = {text_hash(text): text for text in texts if text}
+        ids = dict(cls.objects.filter(hash__in=list(by_hash)).values_list('hash', 'id'))
+        new = [
+            cls(hash=blob_hash, data=compress(text), size=len(text.encode('utf-8')))
+            for blob_hash, text in by_hash.items() if blob_hash not in ids
+        ]
+        if new:
+            cls.objects.bulk_create(new, ignore_conflicts=True)
+            ids.update(cls.objects.filter(hash__in=[blob.hash for blob in new]).values_list('hash', 'id'))
+        return ids
+
+
+# Instance attribute holding {blob field: text} assigned but not stored yet
+PENDING_TEXTS = '_pending_blob_texts'
+
+
+def compressed_text(blob_field: str) -> property:
+    """
+    Text attribute backed by a ContentBlob foreign key. Reading loads and decompresses
+    the blob on first access; assigning keeps the text on the instance until save(),
+    which stores it as a (deduplicated) blob and points the key at it. The model must
+    derive from CompressedTextModel. Empty text reads back as None.
+    """
+    cache_name = f'_{blob_field}_text'
+
+    def get(self):
+        pending = self.__dict__.get(PENDING_TEXTS, {})
+        if blob_field in pending:
+            return pending[blob_field] or None
+        blob_id = getattr(self, f'{blob_field}_id')
+        cached = self.__dict__.get(cache_name)
+        if cached is None or cached[0] != blob_id:
+            cached = (blob_id, getattr(self, blob_field).text if blob_id else None)
+            self.__dict__[cache_name] = cached
+        return cached[1]
+
+    def set(self, text):
+        self.__dict__.setdefault(PENDING_TEXTS, {})[blob_field] = text
+
+    return property(get, set)
+
+
+class CompressedTextModel(models.Model):
+    """
+    Stores the text assigned to compressed_text attributes in save(), in the same
+    transaction as the row, so unsaved instances and failed saves leave no blobs.
+    Writes that skip save(), like bulk_create() and update(), take blob ids from
+    ContentBlob.store_many() instead.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        pending = self.__dict__.get(PENDING_TEXTS)
+        if not pending:
+            return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        storing = {
+            blob_field: text for blob_field, text in pending.items()
+            if update_fields is None or blob_field in update_fields
+        }
+        with transaction.atomic(using=kwargs.get('using')):
+            for blob_field, text in storing.items():
+                blob = ContentBlob.store(text)
+                setattr(self, blob_field, blob)
+                self.__dict__[f'_{blob_field}_text'] = (blob.id, text) if blob else (None, None)
+            super().save(*args, **kwargs)
+        for blob_field in storing:
+            del pending[blob_field]
+
+
+class SitemapURL(CompressedTextModel):
     url = models.URLField(unique=True)
     title = models.CharField(max_length=500, null=True, blank=True)
     meta_desc = models.TextField(null=True, blank=True)
     lastmod = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    content = models.TextField(null=True, blank=True)
+    content_blob = models.ForeignKey(
+        ContentBlob, null=True, blank=True, editable=False, on_delete=models.PROTECT, related_name='+'
+    )
+    # Set when the URL drops out of the sitemap; rows are kept because posts link to them
+    removed_at = models.DateTimeField(null=True, blank=True)
+    # Boilerplate-free extract of content used in prompts, and the content hash it was built from
+    digest = models.TextField(null=True, blank=True)
+    digest_hash = models.CharField(max_length=40, null=True, blank=True)
+
+    content = compressed_text('content_blob')
 
     def __str__(self):
         return self.url
@@ -82,19 +283,78 @@ class Post(models.Model):
 
     def __str__(self):
         return self.story.title
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['story'], name='unique_post_per_story'),
+        ]
     
 
 
-class Remixable(models.Model):
+class PosterImage(models.Model):
+    """A rendered poster, stored once and shared by every remixable with the same poster text or image."""
+    poster_text = models.CharField(max_length=200, db_index=True, blank=True)
+    content_hash = models.CharField(max_length=64, unique=True)
+    image = models.FileField(upload_to='posters/')
+    # "<width>.<webp|jpeg>" -> storage name of a pre-sized rendition
+    variants = models.JSONField(default=dict)
+    width = models.IntegerField()
+    height = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.poster_text or self.image.name
+
+    def srcset(self, extension: str) -> str:
+        renditions = sorted(
+            (int(key.split('.')[0]), name) for key, name in self.variants.items() if key.endswith(f'.{extension}')
+        )
+        return ', '.join(f"{self.image.storage.url(name)} {width}w" for width, name in renditions)
+
+    @property
+    def webp_srcset(self) -> str:
+        return self.srcset('webp')
+
+    @property
+    def jpeg_srcset(self) -> str:
+        return self.srcset('jpeg')
+
+    @property
+    def fallback_url(self) -> str:
+        """The mid-sized JPEG for browsers that ignore srcset."""
+        jpegs = sorted((int(key.split('.')[0]), name) for key, name in self.variants.items() if key.endswith('.jpeg'))
+        if not jpegs:
+            return self.image.url
+        return self.image.storage.url(jpegs[min(1, len(jpegs) - 1)][1])
+
+
+class Remixable(CompressedTextModel):
     url = models.URLField(unique=True)
     is_video = models.BooleanField(default=False)
-    html_content = models.TextField(blank=True, null=True)
-    markdown_content = models.TextField(blank=True, null=True)
+    html_blob = models.ForeignKey(
+        ContentBlob, null=True, blank=True, editable=False, on_delete=models.PROTECT, related_name='+'
+    )
+    markdown_blob = models.ForeignKey(
+        ContentBlob, null=True, blank=True, editable=False, on_delete=models.PROTECT, related_name='+'
+    )
     title = models.CharField(max_length=500, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     remixed_as = models.TextField(blank=True, null=True)
     remixed_image = models.FileField(upload_to='remixed_images/', null=True, blank=True)
+    poster = models.ForeignKey(PosterImage, null=True, blank=True, on_delete=models.SET_NULL, related_name='remixables')
+    # llmops-database page linking to this example, and its sitemap lastmod when last crawled
+    listing_url = models.URLField(null=True, blank=True, db_index=True)
+    listing_lastmod = models.DateTimeField(null=True, blank=True)
+    # HTTP validators from the last fetch of url, sent back to make recrawls conditional
+    etag = models.CharField(max_length=200, null=True, blank=True)
+    last_modified = models.CharField(max_length=100, null=True, blank=True)
+    # Airtable record this remixable was last pushed to, and the hash of the fields pushed
+    airtable_id = models.CharField(max_length=20, null=True, blank=True)
+    airtable_hash = models.CharField(max_length=40, null=True, blank=True)
+
+    html_content = compressed_text('html_blob')
+    markdown_content = compressed_text('markdown_blob')
 
     def __str__(self):
         return self.title or self.url
@@ -0,0 +1,60 @@
+from logging import getLogger
+
+from django.db.models import Max, Min
+
+from .models import OutboxCursor, OutboxEntry
+
+logger = getLogger(__name__)
+
+# Entries read per batch handed to a target
+OUTBOX_BATCH_SIZE = 1000
+
+
+def latest_entry_id() -> int:
+    return OutboxEntry.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def has_cursor(target: str) -> bool:
+    """Whether target has exported before. Without a cursor it needs a full export first."""
+    return OutboxCursor.objects.filter(target=target).exists()
+
+
+def acknowledge(target: str, position: int):
+    """Record that target has delivered every entry up to position. Cursors never move back."""
+    cursor, _ = OutboxCursor.objects.get_or_create(target=target)
+    if position > cursor.position:
+        cursor.position = position
+        cursor.save(update_fields=['position', 'updated_at'])
+
+
+def consume(target: str, models: tuple | None = None, batch_size: int = OUTBOX_BATCH_SIZE):
+    """
+    Yield lists of entries target hasn't delivered yet, oldest first, keeping only those
+    for models if given. A batch is acknowledged only when the next one is requested, so
+    if the consumer raises or breaks out of the loop it is delivered again on the next
+    run. Delivery is at least once: consumers must tolerate repeats.
+
+    Entry ids come from an AUTOINCREMENT key and SQLite commits one writer at a time, so
+    an entry is never committed behind a cursor that has already passed its id.
+    """
+    cursor, _ = OutboxCursor.objects.get_or_create(target=target)
+    while True:
+        entries = list(OutboxEntry.objects.filter(id__gt=cursor.position).order_by('id')[:batch_size])
+        if not entries:
+            return
+        wanted = [entry for entry in entries if models is None or entry.model in models]
+        if wanted:
+            yield wanted
+        cursor.position = entries[-1].id
+        cursor.save(update_fields=['position', 'updated_at'])
+
+
+def compact_outbox() -> int:
+    """Delete entries every target has delivered. Returns the number deleted."""
+    delivered = OutboxCursor.objects.aggregate(position=Min('position'))['position']
+    if delivered is None:
+        return 0
+    deleted, _ = OutboxEntry.objects.filter(id__lte=delivered).delete()
+    if deleted:
+        logger.info(f"Outbox: {deleted} delivered entries compacted")
+    return deleted
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import math
+import os
+from collections import Counter
+from logging import getLogger
+
+import numpy as np
+from django.conf import settings
+
+from .fingerprint import normalize_text
+
+logger = getLogger(__name__)
+
+MAX_FEATURES = 20000
+MIN_DOCUMENT_FREQUENCY = 2
+
+
+def tokenize(title: str, description: str | None) -> list:
+    """Unigrams and bigrams of the normalized title and description."""
+    words = normalize_text(f"{title or ''} {description or ''}").split()
+    return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+
+
+class RelevanceFilter:
+    """
+    TF-IDF + logistic regression model predicting whether the LLM would score a
+    story at or above the relevance threshold. Stories it is confident about
+    rejecting (probability below reject_below) skip the LLM entirely.
+    """
+
+    def __init__(self, vocabulary: dict, idf: np.ndarray, weights: np.ndarray, bias: float,
+                 reject_below: float, metrics: dict | None = None):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+        self.reject_below = reject_below
+        self.metrics = metrics or {}
+
+    def vectorize(self, documents: list) -> 'SparseRows':
+        """L2-normalized TF-IDF rows in coordinate form."""
+        rows, columns, values = [], [], []
+        for row, tokens in enumerate(documents):
+            for token, count in Counter(tokens).items():
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    values.append((1 + math.log(count)) * self.idf[column])
+        matrix = SparseRows(
+            np.array(rows, dtype=np.int64),
+            np.array(columns, dtype=np.int64),
+            np.array(values, dtype=np.float32),
+            len(documents),
+            len(self.vocabulary),
+        )
+        norms = np.sqrt(np.bincount(matrix.rows, weights=matrix.values ** 2, minlength=matrix.n_rows))
+        matrix.values /= np.where(norms == 0, 1, norms)[matrix.rows]
+        return matrix
+
+    def predict_proba(self, documents: list) -> np.ndarray:
+        if not documents:
+            return np.zeros(0)
+        return _sigmoid(self.vectorize(documents).dot(self.weights) + self.bias)
+
+    def should_reject(self, stories: list) -> list:
+        """One bool per story: True if it can be rejected without asking the LLM."""
+        probabilities = self.predict_proba([tokenize(s.get('title'), s.get('description')) for s in stories])
+        return [bool(p < self.reject_below) for p in probabilities]
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'vocabulary': self.vocabulary,
+                'idf': self.idf.tolist(),
+                'weights': self.weights.tolist(),
+                'bias': self.bias,
+                'reject_below': self.reject_below,
+                'metrics': self.metrics,
+            }, f)
+
+    @classmethod
+    def load(cls, path) -> 'RelevanceFilter':
+        with open(path) as f:
+            data = json.load(f)
+        return cls(
+            vocabulary=data['vocabulary'],
+            idf=np.array(data['idf'], dtype=np.float32),
+            weights=np.array(data['weights']),
+            bias=data['bias'],
+            reject_below=data['reject_below'],
+            metrics=data.get('metrics'),
+        )
+
+
+class SparseRows:
+    """Minimal COO sparse matrix; the term matrix is far too wide to hold densely."""
+
+    def __init__(self, rows: np.ndarray, columns: np.ndarray, values: np.ndarray, n_rows: int, n_columns: int):
+        self.rows = rows
+        self.columns = columns
+        self.values = values
+        self.n_rows = n_rows
+        self.n_columns = n_columns
+
+    def select(self, mask: np.ndarray) -> 'SparseRows':
+        """Keep the rows where mask is True, renumbered from 0."""
+        new_index = np.cumsum(mask) - 1
+        keep = mask[self.rows]
+        return SparseRows(new_index[self.rows[keep]], self.columns[keep], self.values[keep],
+                          int(mask.sum()), self.n_columns)
+
+    def dot(self, vector: np.ndarray) -> np.ndarray:
+        return np.bincount(self.rows, weights=self.values * vector[self.columns], minlength=self.n_rows)
+
+    def transpose_dot(self, vector: np.ndarray) -> np.ndarray:
+        return np.bincount(self.columns, weights=self.values * vector[self.rows], minlength=self.n_columns)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-np.clip(x, -30, 30)))
+
+
+def _fit_logistic(X: SparseRows, y: np.ndarray, epochs: int = 300, learning_rate: float = 0.5,
+                  l2: float = 1e-4) -> tuple:
+    """Full-batch gradient descent with balanced class weights."""
+    positives = max(y.sum(), 1)
+    negatives = max(len(y) - y.sum(), 1)
+    sample_weights = np.where(y == 1, len(y) / (2 * positives), len(y) / (2 * negatives))
+    weights = np.zeros(X.n_columns)
+    bias = 0.0
+    for _ in range(epochs):
+        error = (_sigmoid(X.dot(weights) + bias) - y) * sample_weights
+        weights -= learning_rate * (X.transpose_dot(error) / len(y) + l2 * weights)
+        bias -= learning_rate * error.mean()
+    return weights, float(bias)
+
+
+def _is_holdout(article_id: str) -> bool:
+    return hashlib.md5(article_id.encode('utf-8')).digest()[0] < 256 * 0.2
+
+
+def evaluate(y: np.ndarray, probabilities: np.ndarray, reject_below: float) -> dict:
+    """
+    Precision/recall of the filter's pass decision against the stored LLM labels,
+    plus the share of LLM calls it saves and relevant stories it loses.
+    """
+    passed = probabilities >= reject_below
+    true_positives = int((passed & (y == 1)).sum())
+    relevant = int(y.sum())
+    return {
+        'examples': int(len(y)),
+        'relevant': relevant,
+        'precision': true_positives / max(int(passed.sum()), 1),
+        'recall': true_positives / max(relevant, 1),
+        'llm_calls_saved': float((~passed).mean()) if len(y) else 0.0,
+        'relevant_lost': relevant - true_positives,
+    }
+
+
+def choose_reject_threshold(y: np.ndarray, probabilities: np.ndarray, target_recall: float) -> float:
+    """Highest probability cut-off that still passes target_recall of the relevant stories."""
+    relevant = np.sort(probabilities[y == 1])
+    if len(relevant) == 0:
+        return 0.0
+    # The epsilon keeps e.g. 10 * (1 - 0.8) = 1.9999999999999996 from flooring to 1
+    allowed_misses = int(math.floor(len(relevant) * (1 - target_recall) + 1e-9))
+    return float(relevant[allowed_misses])
+
+
+def train(examples: list, relevance_threshold: int = 70, target_recall: float = 0.98) -> RelevanceFilter:
+    """
+    Train on (article_id, title, description, score) examples.
+    A deterministic ~20% of articles is held out to pick the reject threshold and report metrics.
+    The LLM's relevance_reason isn't used: it only exists after the LLM call the filter
+    is there to avoid, so a model trained on it couldn't be applied to new stories.
+    """
+    documents = [tokenize(title, description) for _, title, description, _ in examples]
+    labels = np.array([score >= relevance_threshold for *_, score in examples], dtype=np.float32)
+    holdout = np.array([_is_holdout(article_id) for article_id, *_ in examples])
+    train_indices = np.flatnonzero(~holdout)
+
+    document_frequency = Counter(token for i in train_indices for token in set(documents[i]))
+    terms = [
+        term for term, df in document_frequency.most_common(MAX_FEATURES)
+        if df >= MIN_DOCUMENT_FREQUENCY
+    ]
+    vocabulary = {term: column for column, term in enumerate(terms)}
+    idf = np.array(
+        [math.log((1 + len(train_indices)) / (1 + document_frequency[term])) + 1 for term in terms],
+        dtype=np.float32
+    )
+
+    model = RelevanceFilter(vocabulary, idf, np.zeros(len(terms), dtype=np.float32), 0.0, reject_below=0.0)
+    X = model.vectorize(documents)
+    model.weights, model.bias = _fit_logistic(X.select(~holdout), labels[~holdout])
+
+    holdout_probabilities = _sigmoid(X.select(holdout).dot(model.weights) + model.bias)
+    model.reject_below = choose_reject_threshold(labels[holdout], holdout_probabilities, target_recall)
+    model.metrics = evaluate(labels[holdout], holdout_probabilities, model.reject_below)
+    model.metrics['trained_on'] = int(len(train_indices))
+    return model
+
+
+_model = None
+_model_mtime = None
+
+
+def get_relevance_filter() -> RelevanceFilter | None:
+    """The trained filter, reloaded if the model file changed, or None if there isn't one."""
+    global _model, _model_mtime
+    path = settings.RELEVANCE_FILTER_PATH
+    if not settings.RELEVANCE_FILTER_ENABLED or not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if _model is None or mtime != _model_mtime:
+        _model = RelevanceFilter.load(path)
+        _model_mtime = mtime
+    return _model
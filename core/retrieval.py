@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from logging import getLogger
+
+import numpy as np
+from django.conf import settings
+
+from .blobs import decompress
+from .fingerprint import normalize_text
+from .models import SitemapURL
+
+logger = getLogger(__name__)
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers him his how i if in into is it its itself just me more most my no nor not now of off on once
+only or other our ours out over own same she should so some such than that the their theirs them then
+there these they this those through to too under until up very was we were what when where which while
+who whom why will with would you your yours
+""".split())
+
+# Field weights: a term in the title counts as much as three in the body
+FIELD_WEIGHTS = (('title', 3), ('meta_desc', 2), ('content', 1))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str | None) -> list:
+    return [word for word in normalize_text(text).split() if word not in STOPWORDS and len(word) > 1]
+
+
+def page_hash(title: str | None, meta_desc: str | None, content: str | None) -> str:
+    return hashlib.sha1(f"{title}\0{meta_desc}\0{content}".encode('utf-8')).hexdigest()
+
+
+class BM25Index:
+    """
+    BM25 over sitemap pages, stored as per-document term counts in CSR form
+    (indptr/term_ids/counts) with a column-sorted copy for query-time postings.
+    Each document carries the hash of the text it was built from, so an update
+    only re-tokenizes pages that changed.
+    """
+
+    def __init__(self, doc_ids: np.ndarray, doc_hashes: list, vocabulary: list,
+                 indptr: np.ndarray, term_ids: np.ndarray, counts: np.ndarray):
+        self.doc_ids = doc_ids
+        self.doc_hashes = doc_hashes
+        self.vocabulary = vocabulary
+        self.term_index = {term: i for i, term in enumerate(vocabulary)}
+        self.indptr = indptr
+        self.term_ids = term_ids
+        self.counts = counts
+        self._prepare()
+
+    def _prepare(self):
+        n_docs = len(self.doc_ids)
+        self.entry_docs = np.repeat(np.arange(n_docs), np.diff(self.indptr))
+        self.doc_lengths = np.bincount(self.entry_docs, weights=self.counts, minlength=n_docs).astype(np.float32)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if n_docs else 0.0
+        # Postings: entries sorted by term, with the slice for term t at term_starts[t]:term_starts[t + 1]
+        self.postings = np.argsort(self.term_ids, kind='stable')
+        self.term_starts = np.searchsorted(self.term_ids[self.postings], np.arange(len(self.vocabulary) + 1))
+        document_frequency = np.diff(self.term_starts)
+        self.idf = np.log(1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def search(self, text: str, k: int) -> list:
+        """Top-k (SitemapURL id, score) pairs for the query text, best first."""
+        terms = {self.term_index[t] for t in tokenize(text) if t in self.term_index}
+        if not terms or not len(self.doc_ids):
+            return []
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / max(self.avg_doc_length, 1e-9))
+        for term in terms:
+            entries = self.postings[self.term_starts[term]:self.term_starts[term + 1]]
+            docs = self.entry_docs[entries]
+            tf = self.counts[entries]
+            scores[docs] += self.idf[term] * tf * (BM25_K1 + 1) / (tf + length_norm[docs])
+        k = min(k, int((scores > 0).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.doc_ids[i]), float(scores[i])) for i in top]
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            doc_ids=self.doc_ids,
+            indptr=self.indptr,
+            term_ids=self.term_ids,
+            counts=self.counts,
+            meta=np.array(json.dumps({'doc_hashes': self.doc_hashes, 'vocabulary': self.vocabulary})),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path) -> 'BM25Index':
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(data['doc_ids'], meta['doc_hashes'], meta['vocabulary'],
+                       data['indptr'], data['term_ids'], data['counts'])
+
+    @classmethod
+    def empty(cls) -> 'BM25Index':
+        return cls(np.zeros(0, dtype=np.int64), [], [], np.zeros(1, dtype=np.int64),
+                   np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+
+
+def _weighted_counts(title: str | None, meta_desc: str | None, content: str | None) -> Counter:
+    counts = Counter()
+    for (_, weight), text in zip(FIELD_WEIGHTS, (title, meta_desc, content)):
+        for term in tokenize(text):
+            counts[term] += weight
+    return counts
+
+
+def build_sitemap_index(previous: BM25Index | None = None) -> tuple:
+    """
+    Build the index over matchable SitemapURL rows, reusing term counts from
+    `previous` for pages whose text hasn't changed.
+    Returns (index, number of pages re-tokenized).
+    """
+    previous = previous or BM25Index.empty()
+    previous_rows = {
+        int(doc_id): (doc_hash, position)
+        for position, (doc_id, doc_hash) in enumerate(zip(previous.doc_ids, previous.doc_hashes))
+    }
+    vocabulary = list(previous.vocabulary)
+    term_index = dict(previous.term_index)
+
+    doc_ids, doc_hashes, row_terms, row_counts = [], [], [], []
+    retokenized = 0
+    rows = matchable_pages().values_list('id', 'title', 'meta_desc', 'content_blob__data')
+    for doc_id, title, meta_desc, data in rows.iterator(chunk_size=500):
+        content = decompress(data)
+        doc_hash = page_hash(title, meta_desc, content)
+        cached = previous_rows.get(doc_id)
+        if cached and cached[0] == doc_hash:
+            start, end = previous.indptr[cached[1]], previous.indptr[cached[1] + 1]
+            terms, counts = previous.term_ids[start:end], previous.counts[start:end]
+        else:
+            weighted = _weighted_counts(title, meta_desc, content)
+            for term in weighted:
+                if term not in term_index:
+                    term_index[term] = len(vocabulary)
+                    vocabulary.append(term)
+            terms = np.array([term_index[term] for term in weighted], dtype=np.int64)
+            counts = np.array(list(weighted.values()), dtype=np.float32)
+            retokenized += 1
+        doc_ids.append(doc_id)
+        doc_hashes.append(doc_hash)
+        row_terms.append(terms)
+        row_counts.append(counts)
+
+    indptr = np.zeros(len(doc_ids) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(terms) for terms in row_terms])
+    index = BM25Index(
+        np.array(doc_ids, dtype=np.int64),
+        doc_hashes,
+        vocabulary,
+        indptr,
+        np.concatenate(row_terms) if row_terms else np.zeros(0, dtype=np.int64),
+        np.concatenate(row_counts) if row_counts else np.zeros(0, dtype=np.float32),
+    )
+    return index, retokenized
+
+
+def matchable_pages():
+    """SitemapURL rows that can be matched to stories: still in the sitemap and crawled."""
+    return SitemapURL.objects.filter(removed_at__isnull=True, content_blob__isnull=False)
+
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def update_sitemap_index() -> BM25Index:
+    """Rebuild the on-disk index, re-tokenizing only pages that changed."""
+    global _index, _index_mtime
+    path = settings.RETRIEVAL_INDEX_PATH
+    with _index_lock:
+        previous = BM25Index.load(path) if os.path.exists(path) else None
+        index, retokenized = build_sitemap_index(previous)
+        index.save(path)
+        _index, _index_mtime = index, os.path.getmtime(path)
+    logger.info(f"Sitemap retrieval index: {len(index)} pages, {retokenized} re-tokenized")
+    return index
+
+
+def get_sitemap_index() -> BM25Index:
+    """The current index, reloaded if another process rebuilt it, or built if missing."""
+    global _index, _index_mtime
+    path = settings.RETRIEVAL_INDEX_PATH
+    if not os.path.exists(path):
+        return update_sitemap_index()
+    mtime = os.path.getmtime(path)
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            _index, _index_mtime = BM25Index.load(path), mtime
+        return _index
+
+
+RRF_K = 60
+
+
+def shortlist_pages(text: str, k: int = None, query_vector=None) -> list:
+    """
+    SitemapURL ids of the top-k pages for the text, best first. With a query
+    vector, BM25 and vector-store rankings are merged by reciprocal rank fusion.
+    """
+    k = k or settings.RETRIEVAL_TOP_K
+    bm25_ids = [doc_id for doc_id, _ in get_sitemap_index().search(text, k * 2)]
+    if query_vector is None:
+        return bm25_ids[:k]
+
+    from .vector_store import get_vector_store
+
+    vector_ids = [int(key) for key, _ in get_vector_store('sitemap').search(query_vector, k * 2)]
+    fused = Counter()
+    for ranking in (bm25_ids, vector_ids):
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] += 1 / (RRF_K + rank + 1)
+    return [doc_id for doc_id, _ in fused.most_common(k)]
@@ -1,84 +1,277 @@
 from usp.tree import sitemap_tree_for_homepage
-from bs4 import BeautifulSoup
+from collections import Counter
+import lxml.html
+from lxml import etree
 from markdownify import markdownify as md
-import requests
+from core.blobs import delete_unreferenced_blobs
+from core.crawler import CRAWL_WORKERS, Crawler
 from core.models import Remixable, RemixableImage
+from core.outbox import acknowledge, compact_outbox, consume, has_cursor, latest_entry_id
 from logging import getLogger
 import os
+import time
 from pyairtable import Api
 from typing import Dict, Any
 import base64
+import hashlib
+import json
 from django.core.files.storage import default_storage
+from django.db import transaction
 
 logger = getLogger(__name__)
 
-def crawl_llm_examples():
-    logger.info("Starting to crawl LLM examples")
-    def get_example_url(page_url: str) -> str | None:
-        try:
-            response = requests.get(page_url)
-            soup = BeautifulSoup(response.text, "html.parser")
-            link = soup.find("a", class_="llm-link")
-            
-            if link is None:
-                print(f"No llm-link found on {page_url}")
-                return None
-            
-            return link.get("href") or link.text.strip()
-        except Exception as e:
-            print(f"Error processing {page_url}: {str(e)}")
+# Never article content; dropped before the main node is chosen
+NON_CONTENT_TAGS = ('script', 'style', 'noscript', 'template', 'svg', 'iframe')
+# Page chrome that can sit inside the main node
+CHROME_TAGS = ('nav', 'aside', 'footer', 'form', 'button')
+# An <article>/<main> holding less of the page's words than this is a teaser, not the content
+MIN_MAIN_SHARE = 0.25
+
+
+def parse_html(html: str):
+    """Parse a page with lxml. Encoded first, so pages declaring an XML encoding still parse."""
+    return lxml.html.document_fromstring(html.encode('utf-8'), parser=lxml.html.HTMLParser(encoding='utf-8'))
+
+
+def word_count(node) -> int:
+    return len(' '.join(node.itertext()).split())
+
+
+def main_node(root):
+    """
+    The element holding the article: the largest <article>, <main> or role=main
+    element if it has a fair share of the page's words, otherwise the element
+    directly containing the most paragraph text.
+    """
+    body = root.find('body')
+    if body is None:
+        body = root
+    total = word_count(body)
+    for xpath in ('//article', '//main', '//*[@role="main"]'):
+        nodes = root.xpath(xpath)
+        if nodes:
+            node = max(nodes, key=word_count)
+            if word_count(node) >= total * MIN_MAIN_SHARE:
+                return node
+    paragraph_text = Counter()
+    for paragraph in body.iter('p'):
+        paragraph_text[paragraph.getparent()] += len(paragraph.text_content())
+    if paragraph_text:
+        return paragraph_text.most_common(1)[0][0]
+    return body
+
+
+def parse_example_link(html: str) -> str | None:
+    """The external example URL linked from an llmops-database listing page, if any."""
+    try:
+        root = parse_html(html)
+    except etree.ParserError:
+        # Empty, whitespace or comment-only documents
+        return None
+    links = root.xpath('//a[contains(concat(" ", normalize-space(@class), " "), " llm-link ")]')
+    if not links:
+        return None
+    return links[0].get("href") or links[0].text_content().strip()
+
+
+def parse_llm_example(html_content: str) -> dict:
+    """
+    Title, image URLs and markdown of an example page from a single lxml parse.
+    Scripts, styles and page chrome are stripped and only the main article node
+    is converted, which keeps navigation and footers out of the remix prompt.
+    """
+    root = parse_html(html_content)
+    title = root.xpath('string(//meta[@property="og:title"]/@content)').strip() or root.findtext('.//title')
+    etree.strip_elements(root, etree.Comment, *NON_CONTENT_TAGS, with_tail=False)
+    node = main_node(root)
+    etree.strip_elements(node, *CHROME_TAGS, with_tail=False)
+
+    # Extract the article's image URLs
+    image_urls = [src for src in node.xpath('.//img/@src') if src.startswith(('http://', 'https://'))]
+
+    return {
+        "title": title.strip() if title else None,
+        "markdown_content": md(lxml.html.tostring(node, encoding='unicode')).strip(),
+        "image_urls": image_urls
+    }
+
+
+# Marks an example whose stored copy is still current
+UNCHANGED = 'unchanged'
+
+
+def conditional_headers(remixable: Remixable) -> dict:
+    """If-None-Match / If-Modified-Since from the validators saved on the last fetch."""
+    headers = {}
+    if remixable.etag:
+        headers['If-None-Match'] = remixable.etag
+    if remixable.last_modified:
+        headers['If-Modified-Since'] = remixable.last_modified
+    return headers
+
+
+def crawl_llm_example(crawler: Crawler, page_url: str, stored: dict, example_url: str | None = None,
+                      full: bool = False) -> dict | None:
+    """
+    Fetch a listing page and the example it links to. If example_url is given the
+    listing page is known to be unchanged and isn't fetched, and an example already
+    in stored (url -> Remixable) is requested conditionally unless full is set.
+    When the listing is fetched (it's new or its lastmod moved) the example is
+    always fetched in full.
+    Returns {'example_url', 'content', 'etag', 'last_modified'} where content is the
+    parsed example, None for videos or UNCHANGED; or None on failure.
+    """
+    listing_fetched = example_url is None
+    if listing_fetched:
+        response = crawler.fetch(page_url)
+        if response is None:
             return None
-        
-    def get_llm_example_content(example_url: str) -> dict:
-        try:
-            html_content = requests.get(example_url).text
-            soup = BeautifulSoup(html_content, "html.parser")
-            title = soup.find("meta", property="og:title")["content"]
-            markdown_content = md(html_content)
-            
-            # Extract all image URLs
-            image_urls = []
-            for img in soup.find_all('img'):
-                src = img.get('src')
-                if src and src.startswith(('http://', 'https://')):
-                    image_urls.append(src)
-            
-            return {
-                "title": title,
-                "markdown_content": markdown_content,
-                "image_urls": image_urls
-            }
-        except Exception as e:
-            print(f"Error processing {example_url}: {str(e)}")
+        example_url = parse_example_link(response.text)
+        if example_url is None:
+            print(f"No llm-link found on {page_url}")
             return None
-    
+    if 'youtube' in example_url:
+        return {'example_url': example_url, 'content': None}
+
+    headers = {}
+    if example_url in stored and not (full or listing_fetched):
+        headers = conditional_headers(stored[example_url])
+    response = crawler.fetch(example_url, headers=headers)
+    if response is None:
+        return None
+    if response.status_code == 304:
+        return {'example_url': example_url, 'content': UNCHANGED}
+    try:
+        content = parse_llm_example(response.text)
+    except Exception as e:
+        print(f"Error processing {example_url}: {str(e)}")
+        return None
+    # Kept so extraction changes can be re-run and benchmarked against real pages
+    content['html_content'] = response.text
+    return {
+        'example_url': example_url,
+        'content': content,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+
+
+def save_llm_example(example_url: str, content: dict | str | None, **crawl_state) -> tuple:
+    """
+    Store a crawled example, updating the stored copy if it changed. crawl_state holds
+    Remixable listing and validator fields; None values are left as they are.
+    Returns (remixable, status) with status one of new, changed or unchanged.
+    """
+    crawl_state = {field: value for field, value in crawl_state.items() if value is not None}
+    if content is UNCHANGED:
+        if crawl_state:
+            Remixable.objects.filter(url=example_url).update(**crawl_state)
+        return Remixable.objects.filter(url=example_url).first(), 'unchanged'
+    if content is None:
+        remixable, created = Remixable.objects.update_or_create(
+            url=example_url, defaults=crawl_state, create_defaults={'is_video': True, **crawl_state}
+        )
+        return remixable, 'new' if created else 'unchanged'
 
+    image_urls = content.pop('image_urls', [])
+    remixable, created = Remixable.objects.get_or_create(url=example_url, defaults={**content, **crawl_state})
+    status = 'new' if created else 'unchanged'
+    if not created:
+        changed = {field: value for field, value in content.items() if getattr(remixable, field) != value}
+        # Raw HTML churns with ads and tracking; only a change in the extracted text counts
+        if set(changed) - {'html_content'}:
+            status = 'changed'
+        for field, value in {**changed, **crawl_state}.items():
+            setattr(remixable, field, value)
+        if changed or crawl_state:
+            remixable.save()
+
+    # Save associated images that aren't stored yet
+    known = set(RemixableImage.objects.filter(remixable=remixable).values_list('image_url', flat=True))
+    RemixableImage.objects.bulk_create([
+        RemixableImage(remixable=remixable, image_url=image_url)
+        for image_url in dict.fromkeys(image_urls) if image_url not in known
+    ])
+    return remixable, status
+
+
+def crawl_llm_examples(max_workers: int = CRAWL_WORKERS, full: bool = False):
+    """
+    Crawl the zenml LLMOps database: listing pages and the examples they link to are
+    fetched concurrently, and rows are saved on this thread as each example arrives.
+
+    Unless full is set the crawl is incremental. Listing pages already mapped to an
+    example are skipped while their sitemap lastmod hasn't moved; once it moves, the
+    listing and its example are fetched again. Examples of listings without a lastmod
+    are re-requested conditionally, so just new or changed examples are parsed.
+    """
+    logger.info("Starting to crawl LLM examples")
+    start = time.monotonic()
     sitemap = sitemap_tree_for_homepage("https://www.zenml.io/sitemap.xml")
-    pages = sitemap.all_pages()
-    llm_example_pages = [page for page in pages if "llmops-database" in page.url]
-    for page in llm_example_pages:
-        print(page.url) 
-        example_url = get_example_url(page.url)
-        if example_url is None:
-            continue
-        print(example_url, '\n')
-        if 'youtube' in example_url:
-            remixable, _ = Remixable.objects.get_or_create(url=example_url, defaults={"is_video": True})
+    pages = {page.url: page.last_modified for page in sitemap.all_pages() if "llmops-database" in page.url}
+    logger.info(f"Found {len(pages)} LLM example pages in the sitemap")
+
+    stored = {
+        remixable.url: remixable
+        for remixable in Remixable.objects.only('id', 'url', 'listing_url', 'listing_lastmod', 'etag', 'last_modified')
+    }
+    by_listing = {remixable.listing_url: remixable for remixable in stored.values() if remixable.listing_url}
+
+    # page_url -> example_url, or None when the listing page itself must be fetched
+    to_crawl = {}
+    skipped = 0
+    for page_url, lastmod in pages.items():
+        remixable = by_listing.get(page_url)
+        if full or remixable is None:
+            to_crawl[page_url] = None
+        elif lastmod is not None and lastmod == remixable.listing_lastmod:
+            skipped += 1
+        elif lastmod is not None:
+            # The listing changed, so the example it links to may have too
+            to_crawl[page_url] = None
+        elif conditional_headers(remixable):
+            to_crawl[page_url] = remixable.url
         else:
-            example_content = get_llm_example_content(example_url)
-            if not example_content:
-                continue
-            image_urls = example_content.pop('image_urls', [])
-            remixable, _ = Remixable.objects.get_or_create(url=example_url, defaults=example_content)
-            
-            # Save associated images
-            for image_url in image_urls:
-                RemixableImage.objects.get_or_create(
-                    remixable=remixable,
-                    image_url=image_url
+            skipped += 1
+    logger.info(f"Crawling {len(to_crawl)} listing pages, {skipped} unchanged since the last crawl")
+
+    crawler = Crawler(max_workers=max_workers)
+    counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'failed': 0}
+    for page_url, result in crawler.map(
+        lambda url: crawl_llm_example(crawler, url, stored, to_crawl[url], full), to_crawl
+    ):
+        if result is None:
+            counts['failed'] += 1
+            continue
+        example_url = result['example_url']
+        try:
+            # Atomic, so a failed save leaves no listing_lastmod behind and is retried next run
+            with transaction.atomic():
+                _, status = save_llm_example(
+                    example_url,
+                    result['content'],
+                    listing_url=page_url,
+                    listing_lastmod=pages[page_url],
+                    etag=result.get('etag'),
+                    last_modified=result.get('last_modified'),
                 )
-    logger.info("Finished crawling LLM examples")
+        except Exception as e:
+            logger.error(f"Error saving {example_url}: {str(e)}")
+            counts['failed'] += 1
+            continue
+        counts[status] += 1
+        if status != 'unchanged':
+            print(f"{page_url}\n{example_url} ({status})\n")
+    logger.info(
+        f"Finished crawling LLM examples in {time.monotonic() - start:.1f}s: {counts['new']} new, "
+        f"{counts['changed']} changed, {counts['unchanged'] + skipped} unchanged, {counts['failed']} failed"
+    )
     logger.info(f"{Remixable.objects.count()} remixables now in db")
+    # Changed examples point at new blobs; drop the versions they replaced
+    deleted = delete_unreferenced_blobs()
+    if deleted:
+        logger.info(f"Deleted {deleted} unreferenced content blobs")
+    return counts
 
 def print_airtable_schema():
     AIRTABLE_API_KEY = os.getenv('AIRTABLE_API_KEY')
@@ -98,51 +291,155 @@ def print_airtable_schema():
         print("No records found in Airtable")
 
 
-def sync_remixables_to_airtable():
+# Airtable accepts at most 10 records per write and 5 requests per second per base
+AIRTABLE_BATCH_SIZE = 10
+AIRTABLE_REQUEST_INTERVAL = 0.2
+# Outbox cursor of the Airtable export
+AIRTABLE_OUTBOX_TARGET = 'airtable'
+
+
+class _Pacer:
+    """Spaces successive calls at least interval seconds apart."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_start = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_start > now:
+            time.sleep(self.next_start - now)
+        self.next_start = max(now, self.next_start) + self.interval
+
+
+def airtable_fields(remixable: Remixable, base_url: str) -> dict:
+    """The Airtable fields of a remixable, except the transcript (see airtable_hash)."""
+    fields = {
+        'video_url': remixable.url,
+        'video_title': remixable.title,
+        'post': remixable.remixed_as,
+    }
+    # Add image URL if available
+    if remixable.remixed_image and remixable.remixed_image.name:
+        fields['image'] = [{'url': f"{base_url}/media/{remixable.remixed_image.name}"}]
+    return fields
+
+
+def airtable_hash(fields: dict, remixable: Remixable) -> str:
+    """Hash of everything synced for a remixable. The transcript counts by its content hash, so it isn't loaded."""
+    synced = [fields, remixable.markdown_blob.hash if remixable.markdown_blob_id else None]
+    return hashlib.sha1(json.dumps(synced, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _mark_synced(chunk: list, records: list):
+    """Store the Airtable record id and synced hash of each remixable in a written chunk."""
+    ids_by_url = {record['fields'].get('video_url'): record['id'] for record in records}
+    for remixable, _, record_hash in chunk:
+        remixable.airtable_id = ids_by_url.get(remixable.url, remixable.airtable_id)
+        remixable.airtable_hash = record_hash
+    Remixable.objects.bulk_update([remixable for remixable, _, _ in chunk], ['airtable_id', 'airtable_hash'])
+
+
+def _push_to_airtable(table, pacer: _Pacer, remote_index, remixables, base_url: str, full: bool,
+                      summary: dict) -> bool:
+    """
+    Send the remixables whose synced fields changed (all of them if full) and add the
+    counts to summary. remote_index() returns the remote video_url -> record id index.
+    Returns False if any record failed to sync.
+    """
+    changed = []
+    total = 0
+    for remixable in remixables:
+        total += 1
+        fields = airtable_fields(remixable, base_url)
+        record_hash = airtable_hash(fields, remixable)
+        if full or record_hash != remixable.airtable_hash:
+            changed.append((remixable, fields, record_hash))
+    logger.info(f"{len(changed)} of {total} remixables changed since the last Airtable sync")
+    summary['changed'] += len(changed)
+    if not changed:
+        return True
+
+    # Records synced before ids were stored locally are found in the remote table
+    remote_ids = remote_index() if any(not remixable.airtable_id for remixable, _, _ in changed) else {}
+    existing = [item for item in changed if item[0].airtable_id or item[0].url in remote_ids]
+    new = [item for item in changed if not (item[0].airtable_id or item[0].url in remote_ids)]
+    failed = summary['failed']
+
+    def write(items, send, counter):
+        for start in range(0, len(items), AIRTABLE_BATCH_SIZE):
+            chunk = items[start:start + AIRTABLE_BATCH_SIZE]
+            records = [{**fields, 'transcript': remixable.markdown_content} for remixable, fields, _ in chunk]
+            pacer.wait()
+            summary['requests'] += 1
+            try:
+                _mark_synced(chunk, send(records))
+            except Exception as e:
+                logger.error(f"Error syncing {len(chunk)} remixables to Airtable: {str(e)}")
+                summary['failed'] += len(chunk)
+                continue
+            summary[counter] += len(chunk)
+
+    # Upserting on video_url also recreates rows deleted in Airtable since their id was stored
+    write(existing, lambda records: table.batch_upsert(
+        [{'fields': fields} for fields in records], key_fields=['video_url']
+    )['records'], 'updated')
+    write(new, table.batch_create, 'created')
+    return summary['failed'] == failed
+
+
+def sync_remixables_to_airtable(full: bool = False) -> dict:
+    """
+    Push remixables with remixed content to Airtable, ten per request and at most five
+    requests a second. Only remixables with new entries in the outbox are looked at, and
+    of those only records whose synced fields changed are sent, so the cost follows the
+    number of changes rather than the table size. The first run, or a full one, compares
+    every remixable instead (and full sends them all). Entries are acknowledged once their
+    batch synced without failures; otherwise they are delivered again on the next run.
+    """
     AIRTABLE_API_KEY = os.getenv('AIRTABLE_API_KEY')
     BASE_ID = 'app1qC1c10uiW1DRr'
     TABLE_ID = 'tbllQR6GmaJD579oS'
     BASE_URL = os.getenv('BASE_URL', 'https://ainews.apps.innermaps.org').rstrip('/')
-    
+
     api = Api(AIRTABLE_API_KEY)
     table = api.table(BASE_ID, TABLE_ID)
-    
-    # Get all remixables that have remixed_as content
-    remixables = Remixable.objects.exclude(remixed_as__isnull=True).exclude(remixed_as='').exclude(markdown_content__isnull=True)
-    logger.info(f"Found {remixables.count()} remixables with remixed content")
-    
-    for remixable in remixables:
-        try:
-            # Prepare the record data
-            fields = {
-                'video_url': remixable.url,
-                'video_title': remixable.title,
-                'post': remixable.remixed_as,
-                'transcript': remixable.markdown_content
-            }
-            
-            # Add image URL if available
-            if remixable.remixed_image and remixable.remixed_image.name:
-                image_url = f"{BASE_URL}/media/{remixable.remixed_image.name}"
-                logger.info(f"Adding image URL: {image_url}")
-                fields['image'] = [{'url': image_url}]
-            
-            # Try to find existing record by video_url
-            existing_records = table.all(formula=f"{{video_url}}='{remixable.url}'")
-            
-            if existing_records:
-                # Update existing record
-                record_id = existing_records[0]['id']
-                table.update(record_id, fields)
-                logger.info(f"Updated Airtable record for: {remixable.url}")
-            else:
-                # Create new record
-                table.create(fields)
-                logger.info(f"Created new Airtable record for: {remixable.url}")
-                
-        except Exception as e:
-            logger.error(f"Error syncing remixable {remixable.url} to Airtable: {str(e)}")
-    
-    logger.info("Finished syncing remixables to Airtable")
+    pacer = _Pacer(AIRTABLE_REQUEST_INTERVAL)
+    summary = {'changed': 0, 'created': 0, 'updated': 0, 'failed': 0, 'requests': 0}
+    remote_ids = None
+
+    def remote_index() -> dict:
+        """video_url -> Airtable record id, read from the remote table once per run."""
+        nonlocal remote_ids
+        if remote_ids is None:
+            remote_ids = {}
+            pacer.wait()
+            for page in table.iterate(fields=['video_url']):
+                remote_ids.update((record['fields'].get('video_url'), record['id']) for record in page)
+                summary['requests'] += 1
+                pacer.wait()
+        return remote_ids
 
+    # Get all remixables that have remixed_as content
+    remixables = Remixable.objects.exclude(remixed_as__isnull=True).exclude(remixed_as='').exclude(
+        markdown_blob__isnull=True
+    ).select_related('markdown_blob').defer('markdown_blob__data')
+    if full or not has_cursor(AIRTABLE_OUTBOX_TARGET):
+        # Changes made while the scan runs are past this mark and get delivered next run
+        mark = latest_entry_id()
+        if _push_to_airtable(table, pacer, remote_index, remixables, BASE_URL, full, summary):
+            acknowledge(AIRTABLE_OUTBOX_TARGET, mark)
+    else:
+        for entries in consume(AIRTABLE_OUTBOX_TARGET, models=('remixable',)):
+            # Deleted remixables are left in Airtable, as before
+            ids = {entry.object_id for entry in entries if entry.action == 'upsert'}
+            batch = remixables.filter(id__in=ids)
+            if not _push_to_airtable(table, pacer, remote_index, batch, BASE_URL, False, summary):
+                break
+    compact_outbox()
 
+    logger.info(
+        f"Finished syncing remixables to Airtable: {summary['created']} created, {summary['updated']} updated, "
+        f"{summary['failed']} failed in {summary['requests']} requests"
+    )
+    return summary
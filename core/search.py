@@ -0,0 +1,130 @@
+import re
+from logging import getLogger
+
+from django.db import connection, transaction
+
+from .models import Remixable, SitemapURL, Story
+
+logger = getLogger(__name__)
+
+# kind -> (model, indexed columns, BM25 weight per column)
+# The FTS5 tables are external-content indexes over the model tables, kept in
+# sync by the triggers created in migration 0015. Page and remixable text lives
+# in ContentBlob rows, so those two read through views that decompress it
+# (migration 0020); the view columns keep the model's attribute names.
+#
+# Those views and the core_sitemapurl/core_remixable triggers call blob_text(),
+# which only Django's connections define. Any other SQLite client, including the
+# sqlite3 shell and manage.py dbshell, fails with "no such function: blob_text"
+# on every insert and delete and on updates of indexed columns. Write through
+# Django, or run the SQL with `manage.py rebuild_search --sql <file>`.
+SEARCH_INDEXES = {
+    'stories': (Story, ('title', 'description'), (3.0, 1.0)),
+    'pages': (SitemapURL, ('title', 'meta_desc', 'content'), (3.0, 2.0, 1.0)),
+    'remixables': (Remixable, ('title', 'markdown_content'), (3.0, 1.0)),
+}
+
+SNIPPET_TOKENS = 24
+
+
+def fts_table(kind: str) -> str:
+    return f"{SEARCH_INDEXES[kind][0]._meta.db_table}_fts"
+
+
+def fts_query(text: str, match_any: bool = False) -> str:
+    """
+    FTS5 query for free text. Every word is quoted, so user input can't inject
+    FTS5 syntax. Words must all match unless match_any is set.
+    """
+    terms = [f'"{word}"' for word in re.findall(r'\w+', text or '')]
+    return (' OR ' if match_any else ' ').join(terms)
+
+
+class SearchResults:
+    """
+    Lazily evaluated, ranked FTS5 matches. Supports count() and slicing, so it can be
+    handed straight to Django's Paginator; each slice is a single LIMIT/OFFSET query
+    and returns model instances with `rank` (lower is better) and `snippet` set.
+    """
+
+    def __init__(self, kind: str, text: str, match_any: bool = False):
+        if kind not in SEARCH_INDEXES:
+            raise ValueError(f"Unknown search index: {kind}")
+        self.kind = kind
+        self.model, self.columns, self.weights = SEARCH_INDEXES[kind]
+        self.query = fts_query(text, match_any)
+        self.table = fts_table(kind)
+        self._count = None
+
+    def count(self) -> int:
+        if self._count is None:
+            if not self.query:
+                self._count = 0
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT COUNT(*) FROM {self.table} WHERE {self.table} MATCH %s", [self.query])
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def ranked_ids(self, limit: int, offset: int = 0) -> list:
+        """(id, rank, snippet) for one page of matches, best first."""
+        if not self.query or limit <= 0:
+            return []
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, bm25({self.table}, {weights}) AS rank, "
+                f"snippet({self.table}, -1, '<b>', '</b>', '…', {SNIPPET_TOKENS}) "
+                f"FROM {self.table} WHERE {self.table} MATCH %s ORDER BY rank LIMIT %s OFFSET %s",
+                [self.query, limit, offset]
+            )
+            return cursor.fetchall()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            results = self[key:key + 1]
+            if not results:
+                raise IndexError(key)
+            return results[0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        rows = self.ranked_ids(stop - start, start)
+        objects = self.model.objects.in_bulk([row[0] for row in rows])
+        results = []
+        for object_id, rank, snippet in rows:
+            obj = objects.get(object_id)
+            if obj is not None:
+                obj.rank = rank
+                obj.snippet = snippet
+                results.append(obj)
+        return results
+
+
+def search(kind: str, text: str, limit: int = 20, match_any: bool = False) -> list:
+    """Best `limit` matches for the text, as model instances with `rank` and `snippet` set."""
+    return SearchResults(kind, text, match_any)[:limit]
+
+
+def search_ids(kind: str, text: str, limit: int = 20, match_any: bool = True) -> list:
+    """Ids of the best matches, without loading the rows. Defaults to matching any word."""
+    return [row[0] for row in SearchResults(kind, text, match_any).ranked_ids(limit)]
+
+
+def run_sql_script(script: str):
+    """Run SQL statements on Django's connection, where the search triggers can call blob_text()."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        for statement in connection.ops.prepare_sql_script(script):
+            cursor.execute(statement)
+
+
+def rebuild_search_indexes():
+    """Re-read every indexed table, e.g. after writes that bypassed the triggers."""
+    with connection.cursor() as cursor:
+        for kind in SEARCH_INDEXES:
+            table = fts_table(kind)
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+            logger.info(f"Rebuilt search index {table}")
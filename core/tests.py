@@ -1,2 +1,1156 @@
+import io
+import json
+import os
+import math
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core import vector_store
+from core import retrieval, scrapers
+from core.digest import make_digest, page_digest, update_page_digests
+from core.images import save_poster
+from core.batches import poll_batches, submit_post_batches, submit_remixable_batches
+from core.search import SearchResults, search, search_ids
+from core.vector_store import VectorStore, sync_sitemap_vectors, sync_story_vectors
+from core.crawler import Crawler
+from core.llm_cache import LLMCache, cached_response
+from core.outbox import acknowledge, compact_outbox, consume
+from core.relevance_filter import choose_reject_threshold, evaluate, train
+from core.models import (
+    ContentBlob, FeedCursor, OutboxCursor, OutboxEntry, PosterImage, Post, RelevanceJudgement, Remixable, SitemapURL, Source, Story,
+)
+from core.tasks import (
+    _page_batches, assign_relevance_scores, create_post, diff_sitemap, filter_new_stories, generate_post_for_all_stories,
+    get_stories, iter_crawled_pages, prefilter_stories, save_crawled_pages, save_post,
+    save_relevance_judgements, save_stories, score_stories,
+)
+
+
+class TempFilesMixin:
+    """Points every on-disk store (vectors, BM25 index, LLM cache, media) at a temp directory."""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        settings_override = override_settings(
+            VECTOR_STORE_DIR=self.tmp / 'vectors',
+            RETRIEVAL_INDEX_PATH=self.tmp / 'sitemap_index.npz',
+            LLM_CACHE_PATH=self.tmp / 'llm_cache.sqlite3',
+            MEDIA_ROOT=self.tmp / 'media',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        vector_store._stores.clear()
+        self.addCleanup(vector_store._stores.clear)
+        cache_patch = mock.patch('core.llm_cache._cache', None)
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
+
+def story_data(article_id: str, **overrides) -> dict:
+    data = {
+        'article_id': article_id,
+        'title': f'Story {article_id}',
+        'description': 'Crowd workers label training data for speech models.',
+        'link': f'https://news.example/{article_id}',
+        'pubDate': '2026-10-01 12:00:00',
+        'pubDateTZ': 'UTC',
+        'image_url': None,
+        'video_url': None,
+        'language': 'english',
+        'duplicate': False,
+        'relevance_score': 80,
+        'relevance_reason': 'About data labelling',
+        'source_id': 'example',
+        'source_name': 'Example News',
+        'source_url': 'https://news.example',
+        'source_icon': None,
+        'source_priority': 1,
+        'keywords': ['ai', 'data'],
+        'country': ['germany'],
+        'category': ['technology'],
+    }
+    data.update(overrides)
+    return data
+
+
+class SaveStoriesTests(TempFilesMixin, TestCase):
+    def test_saves_new_stories_with_relations_and_skips_known(self):
+        created = save_stories([story_data('a1'), story_data('a2', keywords=['data'])])
+        self.assertEqual({story.article_id for story in created}, {'a1', 'a2'})
+        self.assertEqual(Source.objects.count(), 1)
+        self.assertEqual(set(Story.objects.get(article_id='a1').keywords.values_list('name', flat=True)), {'ai', 'data'})
+
+        self.assertEqual(save_stories([story_data('a1')]), [])
+        self.assertEqual(Story.objects.count(), 2)
+
+    def test_story_with_empty_required_field_is_logged_not_silently_dropped(self):
+        with self.assertLogs('core.tasks', level='ERROR') as logs:
+            created = save_stories([story_data('ok'), story_data('bad', pubDateTZ=None)])
+        self.assertEqual([story.article_id for story in created], ['ok'])
+        self.assertTrue(any('bad' in line and 'pubDateTZ' in line for line in logs.output))
+
+
+class FilterNewStoriesTests(TempFilesMixin, TestCase):
+    def test_skips_saved_judged_flagged_and_repeated_stories(self):
+        save_stories([story_data('saved', title='Annotators unionise in Nairobi')])
+        RelevanceJudgement.objects.create(article_id='judged', title='Quarterly earnings beat estimates', score=5)
+        stories = [
+            story_data('saved', title='Annotators unionise in Nairobi'),
+            story_data('judged', title='Quarterly earnings beat estimates'),
+            story_data('flagged', title='Something else entirely', duplicate=True),
+            story_data('fresh', title='Moderators sue platform over trauma'),
+            story_data('fresh', title='Moderators sue platform over trauma'),
+        ]
+        self.assertEqual([story['article_id'] for story in filter_new_stories(stories)], ['fresh'])
+
+
+class RejectAll:
+    def should_reject(self, stories):
+        return [True] * len(stories)
+
+
+class PrefilterAuditTests(TestCase):
+    def test_rejects_are_dropped_without_audit(self):
+        with mock.patch('core.tasks.get_relevance_filter', return_value=RejectAll()), \
+                override_settings(RELEVANCE_FILTER_AUDIT_RATE=0):
+            self.assertEqual(prefilter_stories([story_data('a'), story_data('b')]), [])
+
+    def test_audited_rejects_are_scored_and_recorded_as_audits(self):
+        with mock.patch('core.tasks.get_relevance_filter', return_value=RejectAll()), \
+                override_settings(RELEVANCE_FILTER_AUDIT_RATE=1):
+            kept = prefilter_stories([story_data('a'), story_data('b')])
+        self.assertEqual([story['article_id'] for story in kept], ['a', 'b'])
+        save_relevance_judgements(kept)
+        self.assertEqual(RelevanceJudgement.objects.filter(audit=True).count(), 2)
+
+
+class LLMCacheTests(TempFilesMixin, TestCase):
+    def test_entries_expire_after_the_ttl(self):
+        cache = LLMCache(self.tmp / 'cache.sqlite3', ttl=60, max_entries=0)
+        with mock.patch('core.llm_cache.time.time', return_value=1000):
+            cache.set('site', 'k', 'reply')
+        with mock.patch('core.llm_cache.time.time', return_value=1059):
+            self.assertEqual(cache.get('site', 'k'), 'reply')
+        with mock.patch('core.llm_cache.time.time', return_value=1061):
+            self.assertIsNone(cache.get('site', 'k'))
+            self.assertEqual(cache.evict(), 1)
+        self.assertEqual(cache.stats(), {'site': {'entries': 0, 'hits': 1, 'misses': 1}})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = LLMCache(self.tmp / 'cache.sqlite3', ttl=0, max_entries=2)
+        for now, key in enumerate(['a', 'b', 'c'], start=1):
+            with mock.patch('core.llm_cache.time.time', return_value=now):
+                cache.set('site', key, key)
+        with mock.patch('core.llm_cache.time.time', return_value=4):
+            cache.get('site', 'a')
+        self.assertEqual(cache.evict(), 1)
+        self.assertEqual([cache.get('site', key) for key in 'abc'], ['a', None, 'c'])
+
+    @override_settings(LLM_CACHE_SITES={'site'})
+    def test_only_replies_the_parser_accepts_are_cached(self):
+        replies = iter(['not json', '{"score": 70}', 'unused'])
+        fetch = mock.Mock(side_effect=lambda: next(replies))
+
+        def parse(text):
+            try:
+                return json.loads(text)
+            except ValueError:
+                return None
+
+        results = [cached_response('site', {'prompt': 'p'}, fetch, parse) for _ in range(3)]
+        self.assertEqual(results, [None, {'score': 70}, {'score': 70}])
+        self.assertEqual(fetch.call_count, 2)
+        counts = LLMCache(self.tmp / 'llm_cache.sqlite3', ttl=0, max_entries=0).stats()
+        self.assertEqual(counts, {'site': {'entries': 1, 'hits': 1, 'misses': 2}})
+
+
+def fake_chat_client(reply):
+    """An Azure OpenAI client whose chat completions answer reply(messages); reply may raise."""
+    def create(messages, **params):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply(messages)))])
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+class RelevanceScoringTests(TempFilesMixin, TestCase):
+    def score_reply(self, messages):
+        title = messages[-1]['content'].split('Title: ')[1].split('\n')[0]
+        if title == 'Story down':
+            raise ConnectionError('provider unavailable')
+        # Later stories answer first, so results complete out of order
+        time.sleep({'Story a': 0.03, 'Story b': 0.02}.get(title, 0))
+        return json.dumps({'Story a': {'score': '85'}, 'Story bad': {'score': 'high'}}.get(title, {'score': 90}))
+
+    def test_a_story_with_a_bad_score_is_skipped_and_the_rest_keep_their_order(self):
+        stories = [story_data(article_id) for article_id in ('a', 'bad', 'down', 'b')]
+        with mock.patch('core.tasks.client', fake_chat_client(self.score_reply)), \
+                self.assertLogs('core.tasks', level='ERROR'):
+            scores = score_stories(stories, max_in_flight=4, batch_size=1)
+            kept = assign_relevance_scores(stories, threshold=70, batch_size=1, prefilter=False)
+        self.assertEqual(scores, [{'score': 85}, None, None, {'score': 90}])
+        self.assertEqual([(story['article_id'], story['relevance_score']) for story in kept], [('a', 85), ('b', 90)])
+
+
+    def batch_reply(self, messages):
+        content = messages[-1]['content']
+        if 'Stories: ' not in content:
+            return self.score_reply(messages)
+        ids = [item['article_id'] for item in json.loads(content.split('Stories: ')[1])]
+        if 'garbled' in ids:
+            return 'not json'
+        # Reversed, one story left out, one with an unusable score and one the request didn't ask about
+        entries = [{'article_id': article_id, 'score': 50 + i, 'reason': 'batch'} for i, article_id in enumerate(ids)]
+        entries = entries[::-1][1:] + [{'article_id': 'stranger', 'score': 99}]
+        entries[0]['score'] = None
+        return json.dumps({'scores': entries})
+
+    def test_batch_replies_are_matched_by_article_id_and_gaps_scored_individually(self):
+        stories = [story_data(article_id) for article_id in ('a', 'b', 'c', 'd')]
+        with mock.patch('core.tasks.client', fake_chat_client(self.batch_reply)), \
+                self.assertLogs('core.tasks', level='WARNING') as logs:
+            scores = score_stories(stories, batch_size=4)
+        # d (left out) and c (scored None) fall back to single-story requests
+        self.assertEqual(scores, [
+            {'score': 50, 'reason': 'batch'}, {'score': 51, 'reason': 'batch'}, {'score': 90}, {'score': 90},
+        ])
+        self.assertTrue(any('missing 2 of 4' in line for line in logs.output))
+
+    def test_unusable_batch_reply_falls_back_to_single_story_requests(self):
+        stories = [story_data(article_id) for article_id in ('garbled', 'a')]
+        with mock.patch('core.tasks.client', fake_chat_client(self.batch_reply)), \
+                self.assertLogs('core.tasks', level='ERROR'):
+            scores = score_stories(stories, batch_size=2)
+        self.assertEqual(scores, [{'score': 90}, {'score': 85}])
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+        self.text = str(data)
+
+    def json(self):
+        return self.data
+
+
+def newsdata_page(article_ids, next_page=None, hours_ago=1):
+    pub_date = (datetime.now(timezone.utc) - timedelta(hours=hours_ago)).strftime('%Y-%m-%d %H:%M:%S')
+    results = [story_data(article_id, pubDate=pub_date) for article_id in article_ids]
+    return FakeResponse({'status': 'success', 'results': results, 'nextPage': next_page})
+
+
+class GetStoriesTests(TestCase):
+    def fetch(self, responses, **kwargs):
+        requested = []
+
+        def fake_get(url, params, timeout):
+            requested.append(params.get('page'))
+            return responses[params.get('page')]
+
+        with mock.patch('core.tasks.requests.get', side_effect=fake_get):
+            pages = [[story['article_id'] for story in page['results']] for page in get_stories(**kwargs)]
+        return pages, requested
+
+    def test_first_run_backfills_to_the_horizon_only(self):
+        responses = {
+            None: newsdata_page(['a', 'b'], next_page='p2'),
+            'p2': newsdata_page(['c'], next_page='p3', hours_ago=24),
+            'p3': newsdata_page(['old'], next_page='p4', hours_ago=24 * 30),
+        }
+        pages, _ = self.fetch(responses, max_pages=1)
+        self.assertEqual(pages, [['a', 'b']])
+        cursor = FeedCursor.objects.get(name='newsdata')
+        self.assertEqual(cursor.next_page, 'p2')
+        self.assertIsNotNone(cursor.backfill_until)
+
+        pages, requested = self.fetch(responses, max_pages=5)
+        self.assertEqual(pages[:2], [['c'], []])
+        self.assertEqual(requested[:2], ['p2', 'p3'])
+        self.assertNotIn('p4', requested)
+
+    def test_walk_resumes_after_a_crash_mid_walk(self):
+        FeedCursor.objects.create(name='newsdata', watermark=datetime.now(timezone.utc) - timedelta(days=1))
+        responses = {
+            None: newsdata_page(['a'], next_page='p2'),
+            'p2': newsdata_page(['b'], next_page='p3', hours_ago=2),
+            'p3': newsdata_page(['c'], hours_ago=3),
+        }
+        with mock.patch('core.tasks.requests.get', side_effect=lambda url, params, timeout: responses[params.get('page')]):
+            stories = get_stories()
+            next(stories)
+            next(stories)
+            stories.close()  # The consumer crashed while processing the second page
+        cursor = FeedCursor.objects.get(name='newsdata')
+        self.assertEqual(cursor.next_page, 'p2')
+        self.assertIsNotNone(cursor.backfill_until)
+
+        responses[None] = newsdata_page([], next_page=None)
+        pages, requested = self.fetch(responses)
+        self.assertEqual(pages[:2], [['b'], ['c']])
+        self.assertEqual(requested[:2], ['p2', 'p3'])
+        cursor.refresh_from_db()
+        self.assertEqual((cursor.next_page, cursor.backfill_until), (None, None))
+
+    def test_failed_request_is_logged(self):
+        responses = {None: FakeResponse({'status': 'error', 'results': {'message': 'API key invalid'}}, 401)}
+        with self.assertLogs('core.tasks', level='ERROR') as logs:
+            pages, _ = self.fetch(responses)
+        self.assertEqual(pages, [])
+        self.assertIn('HTTP 401', logs.output[0])
+
+
+def crawled_page(url, title='Page', body='Body text'):
+    return {'url': url, 'title': title, 'meta_desc': f'About {title}', 'body_text': body}
+
+
+class DiffSitemapTests(TestCase):
+    def test_pages_already_marked_removed_are_not_removed_again(self):
+        import pandas as pd
+
+        lastmod = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        SitemapURL.objects.create(url='https://a/kept', lastmod=lastmod)
+        SitemapURL.objects.create(url='https://a/gone', lastmod=lastmod, removed_at=lastmod)
+        SitemapURL.objects.create(url='https://a/dropped', lastmod=lastmod)
+        sitemap = pd.DataFrame({'loc': ['https://a/kept', 'https://a/new'], 'lastmod': [pd.Timestamp(lastmod)] * 2})
+
+        diff = diff_sitemap(sitemap, sitemap)
+        self.assertEqual(diff['new'], ['https://a/new'])
+        self.assertEqual(diff['changed'], ['https://a/kept'])  # Never crawled successfully
+        self.assertEqual(diff['removed'], ['https://a/dropped'])
+
+
+class SaveCrawledPagesTests(TestCase):
+    def setUp(self):
+        self.lastmod = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+    def test_inserts_new_and_updates_existing_rows(self):
+        removed = SitemapURL.objects.create(
+            url='https://site.example/a', title='Old title', removed_at=datetime(2026, 9, 1, tzinfo=timezone.utc)
+        )
+        lastmod_by_url = {'https://site.example/a': self.lastmod, 'https://site.example/b': self.lastmod}
+        written = save_crawled_pages(
+            [crawled_page('https://site.example/a', 'New title', 'Shared body'),
+             crawled_page('https://site.example/b', 'B', 'Shared body')],
+            lastmod_by_url,
+        )
+        self.assertEqual(written, 2)
+        self.assertEqual(SitemapURL.objects.count(), 2)
+        removed.refresh_from_db()
+        self.assertEqual(removed.title, 'New title')
+        self.assertIsNone(removed.removed_at)
+        self.assertEqual(removed.lastmod, self.lastmod)
+        self.assertEqual(removed.content, 'Shared body')
+        # Identical bodies share one blob
+        self.assertEqual(ContentBlob.objects.count(), 1)
+
+    def test_skips_urls_missing_from_the_sitemap_and_flushes_small_batches(self):
+        pages = [crawled_page(f'https://site.example/{i}') for i in range(5)] + [crawled_page('https://elsewhere.example/')]
+        lastmod_by_url = {f'https://site.example/{i}': self.lastmod for i in range(5)}
+        with self.assertLogs('core.tasks', level='WARNING'):
+            written = save_crawled_pages(iter(pages), lastmod_by_url, batch_size=2)
+        self.assertEqual(written, 5)
+        self.assertFalse(SitemapURL.objects.filter(url='https://elsewhere.example/').exists())
+
+
+class CrawlFileTests(TestCase):
+    def test_iter_crawled_pages_reads_needed_columns_and_skips_bad_lines(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jl', delete=False, encoding='utf-8') as f:
+            f.write(json.dumps({**crawled_page('https://site.example/a'), 'h1': 'Ignored'}) + '\n')
+            f.write('\n{not json\n')
+            f.write(json.dumps({'url': 'https://site.example/b'}) + '\n')
+        self.addCleanup(Path(f.name).unlink)
+        with self.assertLogs('core.tasks', level='ERROR'):
+            pages = list(iter_crawled_pages(f.name))
+        self.assertEqual(pages, [
+            crawled_page('https://site.example/a'),
+            {'url': 'https://site.example/b', 'title': None, 'meta_desc': None, 'body_text': None},
+        ])
+
+    def test_page_batches_are_bounded_by_count_and_text_size(self):
+        pages = [crawled_page(f'https://site.example/{i}', body='x' * 100) for i in range(5)]
+        self.assertEqual([len(batch) for batch in _page_batches(iter(pages), 2, 10_000)], [2, 2, 1])
+        self.assertEqual([len(batch) for batch in _page_batches(iter(pages), 10, 350)], [3, 2])
+
+
+def fake_embed(texts):
+    """Deterministic 4-dimensional vectors from a different 'model' than the hashing default."""
+    return np.array([[len(text), 1, 0, 0] for text in texts], dtype=np.float32)
+
+
+class VectorStoreTests(TempFilesMixin, TestCase):
+    def unit(self, i, dim=8):
+        vector = np.zeros(dim, dtype=np.float32)
+        vector[i] = 1
+        return vector
+
+    def test_compaction_publishes_a_new_file_and_keeps_old_snapshots_valid(self):
+        writer = VectorStore(self.tmp, 'test')
+        reader = VectorStore(self.tmp, 'test')
+        writer.upsert(
+            [(str(i), str(i), str(i)) for i in range(8)],
+            embed=lambda texts: np.array([self.unit(int(text)) for text in texts]), embedder='unit',
+        )
+        meta, old_matrix, _ = reader._snapshot()
+
+        writer.delete(['0', '1', '2'])
+        self.assertEqual(len(list(self.tmp.glob('test.*.f32'))), 1)
+        # The old mapping outlives its file, and the new snapshot maps the compacted rows
+        self.assertEqual(old_matrix.shape, (8, 8))
+        self.assertEqual(reader.search(self.unit(5), 1), [('5', 1.0)])
+        self.assertEqual(reader._snapshot()[1].shape, (5, 8))
+        self.assertIsNone(reader.get('1'))
+
+    def test_new_embedder_re_embeds_every_story(self):
+        save_stories([story_data('a'), story_data('b'), story_data('c')])
+        store = vector_store.get_vector_store('stories')
+        self.assertEqual(len(store), 3)
+
+        with mock.patch('core.vector_store.current_embedder', return_value=('fake:4', fake_embed)):
+            sync_story_vectors(list(Story.objects.filter(article_id='a')))
+        self.assertEqual(len(store), 3)
+        self.assertFalse(store.needs_rebuild('fake:4'))
+
+    def test_new_embedder_re_embeds_every_page(self):
+        for i in range(3):
+            page = SitemapURL(url=f'https://site.example/{i}', title=f'Page {i}')
+            page.content = f'Body of page {i}'
+            page.save()
+        self.assertEqual(sync_sitemap_vectors(), (3, 0))
+        self.assertEqual(sync_sitemap_vectors(), (0, 0))
+
+        with mock.patch('core.vector_store.current_embedder', return_value=('fake:4', fake_embed)):
+            self.assertEqual(sync_sitemap_vectors(), (3, 0))
+        self.assertEqual(len(vector_store.get_vector_store('sitemap')), 3)
+
+
+class PostGenerationTests(TempFilesMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stories = save_stories([story_data(f's{i}', title=f'Story number {i}') for i in range(6)])
+        self.page = SitemapURL(url='https://site.example/page', title='Page')
+        self.page.content = 'Page body'
+        self.page.save()
+
+    def test_save_post_keeps_the_post_another_worker_saved_first(self):
+        story = self.stories[0]
+        first = save_post(story, self.page, 'First')
+        with self.assertLogs('core.tasks', level='INFO'):
+            second = save_post(story, self.page, 'Second')
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(Post.objects.get(story=story).content, 'First')
+
+    def test_create_post_does_not_generate_for_a_story_with_a_post(self):
+        save_post(self.stories[0], self.page, 'Existing')
+        with mock.patch('core.tasks.generate_post_content') as generate:
+            self.assertEqual(create_post(self.stories[0], self.page).content, 'Existing')
+        generate.assert_not_called()
+
+    def test_generates_one_post_per_story_concurrently(self):
+        # The in-memory test database locks whole tables and fails rather than waits on a
+        # concurrent write, so writes are serialized here as SQLite's file locking would
+        write_lock = threading.Lock()
+
+        def locked_create_post(story, sitemap_url):
+            with write_lock:
+                return create_post(story, sitemap_url)
+
+        with mock.patch('core.tasks.match_story_to_page', return_value=(self.page.id, 'Fits')), \
+                mock.patch('core.tasks.generate_post_content', side_effect=lambda story, page: f'Post for {story.title}'), \
+                mock.patch('core.tasks.create_post', side_effect=locked_create_post):
+            generate_post_for_all_stories(max_workers=3)
+        self.assertEqual(
+            set(Post.objects.values_list('content', flat=True)),
+            {f'Post for Story number {i}' for i in range(6)},
+        )
+
+
+class SearchTests(TempFilesMixin, TestCase):
+    def test_triggers_keep_the_story_index_in_sync(self):
+        save_stories([story_data('a', title='Annotators unionise', description='Workers organise.')])
+        story = Story.objects.get(article_id='a')
+        self.assertEqual([result.pk for result in search('stories', 'unionise')], [story.pk])
+
+        story.title = 'Moderators strike'
+        story.save()
+        self.assertEqual(search('stories', 'unionise'), [])
+        self.assertEqual(search_ids('stories', 'strike'), [story.pk])
+
+        story.delete()
+        self.assertEqual(search_ids('stories', 'strike'), [])
+
+    def test_page_index_reads_compressed_content(self):
+        page = SitemapURL(url='https://site.example/a', title='Data annotation')
+        page.content = 'We label lidar point clouds for autonomous driving.'
+        page.save()
+        result, = search('pages', 'lidar')
+        self.assertEqual(result.pk, page.pk)
+        self.assertIn('<b>lidar</b>', result.snippet)
+
+        page.content = 'We transcribe audio.'
+        page.save()
+        self.assertEqual(search_ids('pages', 'lidar'), [])
+        self.assertEqual(search_ids('pages', 'transcribe'), [page.pk])
+
+    def test_sql_run_through_rebuild_search_is_indexed(self):
+        script = self.tmp / 'insert.sql'
+        script.write_text(
+            "INSERT INTO core_remixable (url, is_video, title, created_at, updated_at) "
+            "VALUES ('https://example.com/hand', 0, 'Hand written guardrails', '2026-10-18', '2026-10-18');"
+        )
+        call_command('rebuild_search', '--sql', str(script), stdout=io.StringIO())
+        self.assertEqual(search_ids('remixables', 'guardrails'), [Remixable.objects.get().pk])
+
+    def test_results_are_ranked_and_paginate(self):
+        save_stories(
+            [story_data('title', title='Crowdsourcing wins', description='Unrelated.')]
+            + [story_data(f'd{i}', title=f'Story {i}', description='A note on crowdsourcing.') for i in range(24)]
+        )
+        results = SearchResults('stories', 'crowdsourcing')
+        self.assertEqual(results.count(), 25)
+        self.assertEqual(results[0].article_id, 'title')
+
+        paginator = Paginator(results, 10)
+        self.assertEqual(paginator.num_pages, 3)
+        pages = [[story.pk for story in paginator.page(number)] for number in (1, 2, 3)]
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(len({pk for page in pages for pk in page}), 25)
+
+    def test_query_syntax_in_user_input_is_treated_as_words(self):
+        save_stories([story_data('a', title='Near misses in labelling')])
+        self.assertEqual(len(search('stories', 'NEAR( "labelling" OR title:*')), 0)
+        self.assertEqual(len(search('stories', 'NEAR( labelling', match_any=True)), 1)
+        self.assertEqual(SearchResults('stories', '  ').count(), 0)
+
+    def test_search_api(self):
+        save_stories([story_data('a', title='Annotators unionise')])
+        response = self.client.get('/api/search/', {'q': 'annotators', 'type': 'stories'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(self.client.get('/api/search/', {'type': 'stories'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'x', 'type': 'posts'}).status_code, 400)
+
+
+class FakeAzureBatches:
+    """Azure OpenAI files and batches endpoints; finish() writes the output and error files."""
+
+    def __init__(self):
+        self.files = SimpleNamespace(create=self.create_file, content=self.file_content)
+        self.batches = SimpleNamespace(create=self.create_batch, retrieve=self.retrieve_batch)
+        self.stored = {}
+        self.jobs = {}
+
+    def create_file(self, file, purpose):
+        file_id = f'file-{len(self.stored)}'
+        self.stored[file_id] = file[1].read().decode('utf-8')
+        return SimpleNamespace(id=file_id)
+
+    def file_content(self, file_id):
+        return SimpleNamespace(text=self.stored[file_id])
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        batch_id = f'batch-{len(self.jobs)}'
+        self.jobs[batch_id] = SimpleNamespace(
+            id=batch_id, status='validating', input_file_id=input_file_id, output_file_id=None, error_file_id=None
+        )
+        return self.jobs[batch_id]
+
+    def retrieve_batch(self, batch_id):
+        return self.jobs[batch_id]
+
+    def requests(self, batch_id):
+        return [json.loads(line) for line in self.stored[self.jobs[batch_id].input_file_id].splitlines()]
+
+    def finish(self, batch_id, outputs: dict, errors: list = ()):
+        job = self.jobs[batch_id]
+        output = [
+            {'custom_id': custom_id, 'response': {'status_code': 200, 'body': {
+                'choices': [{'message': {'content': content}}]
+            }}, 'error': None}
+            for custom_id, content in outputs.items()
+        ]
+        error = [
+            {'custom_id': custom_id, 'response': {'status_code': 400, 'body': {'error': {'code': 'content_filter'}}},
+             'error': None}
+            for custom_id in errors
+        ]
+        job.status = 'completed'
+        job.output_file_id = self.create_file(('out.jsonl', io.BytesIO('\n'.join(map(json.dumps, output)).encode())), 'batch').id
+        if error:
+            job.error_file_id = self.create_file(('err.jsonl', io.BytesIO('\n'.join(map(json.dumps, error)).encode())), 'batch').id
+
+
+class FakeAnthropicBatches:
+    """Anthropic Message Batches endpoints; finish() sets each request's result."""
+
+    def __init__(self):
+        self.beta = SimpleNamespace(messages=SimpleNamespace(batches=SimpleNamespace(
+            create=self.create, retrieve=self.retrieve, results=self.results,
+        )))
+        self.jobs = {}
+
+    def create(self, requests):
+        batch_id = f'msgbatch-{len(self.jobs)}'
+        self.jobs[batch_id] = SimpleNamespace(id=batch_id, processing_status='in_progress', requests=requests, results=[])
+        return self.jobs[batch_id]
+
+    def retrieve(self, batch_id):
+        return self.jobs[batch_id]
+
+    def results(self, batch_id):
+        return self.jobs[batch_id].results
+
+    def finish(self, batch_id, texts: dict, errored: list = ()):
+        job = self.jobs[batch_id]
+        job.processing_status = 'ended'
+        job.results = [
+            SimpleNamespace(custom_id=custom_id, result=SimpleNamespace(
+                type='succeeded', message=SimpleNamespace(content=[SimpleNamespace(text=text)])
+            ))
+            for custom_id, text in texts.items()
+        ] + [SimpleNamespace(custom_id=custom_id, result=SimpleNamespace(type='errored')) for custom_id in errored]
+
+
+class BatchTests(TempFilesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.page = SitemapURL(url='https://site.example/page', title='Page', meta_desc='About us')
+        self.page.content = 'Page body'
+        self.page.save()
+
+    @override_settings(AZURE_OPENAI_BATCH_DEPLOYMENT='gpt-4o-mini-batch')
+    def test_azure_post_batch_round_trip(self):
+        stories = save_stories([story_data(f's{i}', title=f'Story number {i}') for i in range(3)])
+        azure = FakeAzureBatches()
+        with mock.patch('core.batches.client', azure), \
+                mock.patch('core.batches.match_stories', side_effect=lambda stories: [(story, self.page.id) for story in stories]):
+            batch, = submit_post_batches()
+            self.assertEqual(submit_post_batches(), [])  # every story is already in flight
+            requests = azure.requests(batch.batch_id)
+            self.assertEqual({request['custom_id'] for request in requests}, set(batch.items))
+            self.assertEqual(requests[0]['body']['model'], 'gpt-4o-mini-batch')
+
+            poll_batches('post_content')
+            batch.refresh_from_db()
+            self.assertIsNone(batch.finished_at)
+
+            custom_ids = [f'story-{story.id}' for story in stories]
+            # One post generated, one rejected (error file), one never run
+            azure.finish(batch.batch_id, {custom_ids[0]: 'Generated post'}, errors=[custom_ids[1]])
+            with self.assertLogs('core.batches', level='ERROR') as logs:
+                poll_batches('post_content')
+
+        batch.refresh_from_db()
+        self.assertIsNotNone(batch.finished_at)
+        self.assertEqual((batch.succeeded, batch.failed), (1, 2))
+        self.assertEqual(Post.objects.get(story=stories[0]).content, 'Generated post')
+        self.assertFalse(Post.objects.filter(story__in=stories[1:]).exists())
+        self.assertTrue(any('content_filter' in line for line in logs.output))
+
+    def test_anthropic_remixable_batch_round_trip(self):
+        remixables = []
+        for i in range(2):
+            remixable = Remixable(url=f'https://www.zenml.io/llmops-database/example-{i}', title=f'Example {i}')
+            remixable.markdown_content = f'# Example {i}\nHow a team shipped an LLM feature.'
+            remixable.save()
+            remixables.append(remixable)
+        anthropic = FakeAnthropicBatches()
+        with mock.patch('core.batches.anthropic_client', anthropic):
+            batch, = submit_remixable_batches()
+            self.assertEqual(len(anthropic.jobs[batch.batch_id].requests), 2)
+            anthropic.finish(
+                batch.batch_id,
+                {f'remixable-{remixables[0].id}': 'Remixed post'},
+                errored=[f'remixable-{remixables[1].id}'],
+            )
+            with self.assertLogs('core.batches', level='ERROR'):
+                poll_batches('remixable_post', images=False)
+
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.succeeded, batch.failed), ('ended', 1, 1))
+        self.assertEqual(Remixable.objects.get(id=remixables[0].id).remixed_as, 'Remixed post')
+        self.assertIsNone(Remixable.objects.get(id=remixables[1].id).remixed_as)
+
+
+def fake_stream(*parts):
+    def deltas(*args):
+        yield from parts
+    return deltas
+
+
+class RegenerateStreamTests(TempFilesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        story, = save_stories([story_data('a')])
+        page = SitemapURL.objects.create(url='https://site.example/page', title='Page')
+        self.post = Post.objects.create(story=story, sitemap_url=page, content='Old post')
+        self.url = f'/api/posts/{self.post.pk}/regenerate/'
+        self.staff = User.objects.create_user('editor', password='x', is_staff=True)
+
+    async def events(self, response) -> str:
+        return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    async def test_requires_staff(self):
+        with mock.patch('core.tasks.stream_post_content', side_effect=fake_stream('New')) as stream:
+            self.assertEqual((await self.async_client.get(self.url)).status_code, 403)
+            await self.async_client.aforce_login(await User.objects.acreate(username='reader'))
+            self.assertEqual((await self.async_client.get(self.url)).status_code, 403)
+        stream.assert_not_called()
+
+    async def test_streams_and_saves_the_new_text(self):
+        await self.async_client.aforce_login(self.staff)
+        with mock.patch('core.tasks.stream_post_content', side_effect=fake_stream('New ', 'post')) as stream:
+            response = await self.async_client.get(self.url)
+            events = await self.events(response)
+        # The prompt, page text included, is built before streaming starts
+        params, = stream.call_args.args
+        self.assertIn('Page', params['messages'][-1]['content'])
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: delta\ndata: {"text": "New "}', events)
+        self.assertIn('event: done', events)
+        await self.post.arefresh_from_db()
+        self.assertEqual(self.post.content, 'New post')
+
+    async def test_empty_generation_keeps_the_old_text(self):
+        await self.async_client.aforce_login(self.staff)
+        with mock.patch('core.tasks.stream_post_content', side_effect=fake_stream()):
+            events = await self.events(await self.async_client.get(self.url))
+        self.assertIn('event: error', events)
+        await self.post.arefresh_from_db()
+        self.assertEqual(self.post.content, 'Old post')
+
+
+class FlakySiteHandler(BaseHTTPRequestHandler):
+    """/ok answers 200, /missing 404, and /flaky 503 the first time it's requested."""
+    hits = {}
+
+    def do_GET(self):
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.path == '/missing' or (self.path == '/flaky' and self.hits[self.path] == 1):
+            status = 404 if self.path == '/missing' else 503
+        else:
+            status = 200
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class CrawlerTests(TestCase):
+    def setUp(self):
+        FlakySiteHandler.hits = {}
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakySiteHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        self.crawler = Crawler(max_workers=4, host_delay=0, timeout=(1, 1))
+
+    def test_fetch_returns_responses_and_retries_server_errors(self):
+        self.assertEqual(self.crawler.fetch(f'{self.base}/ok').text, 'ok')
+        self.assertEqual(self.crawler.fetch(f'{self.base}/flaky').status_code, 200)
+        self.assertEqual(FlakySiteHandler.hits['/flaky'], 2)
+
+    def test_fetch_returns_none_on_client_and_connection_errors(self):
+        with self.assertLogs('core.crawler', level='ERROR') as logs:
+            self.assertIsNone(self.crawler.fetch(f'{self.base}/missing'))
+            # Without retries, so the connection backoff doesn't slow the test down
+            self.assertIsNone(Crawler(retries=0, host_delay=0).fetch('http://127.0.0.1:9/unreachable'))
+        self.assertIn('HTTP 404', logs.output[0])
+        self.assertEqual(FlakySiteHandler.hits['/missing'], 1)
+
+    def test_map_yields_every_item_even_when_one_raises(self):
+        def fetch_text(path):
+            if path == '/boom':
+                raise ValueError('boom')
+            return self.crawler.fetch(f'{self.base}{path}').text
+
+        with self.assertLogs('core.crawler', level='ERROR'):
+            results = dict(self.crawler.map(fetch_text, ['/ok', '/boom', '/flaky']))
+        self.assertEqual(results, {'/ok': 'ok', '/boom': None, '/flaky': 'ok'})
+
+
+class CrawlLLMExamplesTests(TestCase):
+    def test_a_failed_save_is_counted_and_the_crawl_continues(self):
+        lastmod = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        listings = [f'https://www.zenml.io/llmops-database/case-{i}' for i in range(3)]
+        sitemap = SimpleNamespace(all_pages=lambda: [SimpleNamespace(url=url, last_modified=lastmod) for url in listings])
+
+        def crawl(crawler, page_url, stored, example_url=None, full=False, **kwargs):
+            example = page_url.replace('zenml.io/llmops-database', 'example.com')
+            return {'example_url': example, 'content': {'title': page_url, 'markdown_content': f'# {page_url}'}}
+
+        real_save = scrapers.save_llm_example
+
+        def save(example_url, content, **crawl_state):
+            if example_url.endswith('case-1'):
+                raise ValueError('bad row')
+            return real_save(example_url, content, **crawl_state)
+
+        with mock.patch('core.scrapers.sitemap_tree_for_homepage', return_value=sitemap), \
+                mock.patch('core.scrapers.crawl_llm_example', side_effect=crawl), \
+                mock.patch('core.scrapers.save_llm_example', side_effect=save), \
+                self.assertLogs('core.scrapers', level='ERROR'):
+            counts = scrapers.crawl_llm_examples(max_workers=2)
+
+        self.assertEqual((counts['new'], counts['failed']), (2, 1))
+        self.assertEqual(set(Remixable.objects.values_list('listing_url', flat=True)), {listings[0], listings[2]})
+
+    def test_blobs_replaced_by_a_changed_example_are_deleted(self):
+        listing = 'https://www.zenml.io/llmops-database/case'
+        Remixable.objects.create(url=EXAMPLE_URL, listing_url=listing, markdown_content='# Old', html_content='<p>Old</p>')
+        sitemap = SimpleNamespace(all_pages=lambda: [SimpleNamespace(url=listing, last_modified=datetime(2026, 10, 1, tzinfo=timezone.utc))])
+        content = {'title': 'Case', 'markdown_content': '# New', 'html_content': '<p>New</p>'}
+
+        with mock.patch('core.scrapers.sitemap_tree_for_homepage', return_value=sitemap), \
+                mock.patch('core.scrapers.crawl_llm_example', return_value={'example_url': EXAMPLE_URL, 'content': content}):
+            counts = scrapers.crawl_llm_examples(max_workers=1)
+
+        self.assertEqual(counts['changed'], 1)
+        self.assertEqual(sorted(blob.text for blob in ContentBlob.objects.all()), ['# New', '<p>New</p>'])
+
+
+class FakeCrawler:
+    """Serves canned (status, body, headers) per URL and records the headers of each request."""
+
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.requests = []
+
+    def fetch(self, url, headers=None):
+        self.requests.append((url, headers or {}))
+        status, body, response_headers = self.pages[url]
+        return SimpleNamespace(status_code=status, text=body, headers=response_headers)
+
+
+LISTING_URL = 'https://www.zenml.io/llmops-database/case'
+EXAMPLE_URL = 'https://example.com/blog/case'
+LISTING_HTML = f'<html><body><a class="button llm-link" href="{EXAMPLE_URL}">Read</a></body></html>'
+EXAMPLE_HTML = '<html><head><title>Case</title></head><body><article><p>How we shipped it.</p></article></body></html>'
+
+
+class CrawlLLMExampleTests(TestCase):
+    def test_changed_listing_fetches_a_known_example_without_validators(self):
+        stored = {EXAMPLE_URL: Remixable(url=EXAMPLE_URL)}
+        crawler = FakeCrawler({LISTING_URL: (200, LISTING_HTML, {}), EXAMPLE_URL: (200, EXAMPLE_HTML, {'ETag': '"v2"'})})
+        result = scrapers.crawl_llm_example(crawler, LISTING_URL, stored)
+        self.assertEqual(result['content']['markdown_content'], 'How we shipped it.')
+        self.assertEqual(result['etag'], '"v2"')
+        self.assertEqual(crawler.requests, [(LISTING_URL, {}), (EXAMPLE_URL, {})])
+
+    def test_unchanged_listing_revalidates_the_example(self):
+        stored = {EXAMPLE_URL: Remixable(url=EXAMPLE_URL, etag='"v1"')}
+        crawler = FakeCrawler({EXAMPLE_URL: (304, '', {})})
+        result = scrapers.crawl_llm_example(crawler, LISTING_URL, stored, example_url=EXAMPLE_URL)
+        self.assertIs(result['content'], scrapers.UNCHANGED)
+        self.assertEqual(crawler.requests, [(EXAMPLE_URL, {'If-None-Match': '"v1"'})])
+
+
+class ParseExampleTests(TestCase):
+    def test_empty_listing_pages_have_no_example_link(self):
+        for html in ('', '   \n', '<!-- moved -->'):
+            self.assertIsNone(scrapers.parse_example_link(html))
+        self.assertEqual(scrapers.parse_example_link(LISTING_HTML), EXAMPLE_URL)
+
+    def test_crawl_keeps_the_html_for_the_extraction_benchmark(self):
+        crawler = FakeCrawler({LISTING_URL: (200, LISTING_HTML, {}), EXAMPLE_URL: (200, EXAMPLE_HTML, {})})
+        result = scrapers.crawl_llm_example(crawler, LISTING_URL, {})
+        scrapers.save_llm_example(result['example_url'], result['content'])
+        self.assertEqual(Remixable.objects.get().html_content, EXAMPLE_HTML)
+
+        # Markup-only changes are stored without counting as a changed example
+        _, status = scrapers.save_llm_example(
+            EXAMPLE_URL, scrapers.parse_llm_example(EXAMPLE_HTML) | {'html_content': EXAMPLE_HTML + '<!-- ad -->'}
+        )
+        self.assertEqual(status, 'unchanged')
+
+        out = io.StringIO()
+        call_command('benchmark_extraction', '--repeat', '1', stdout=out)
+        self.assertIn('1 pages from stored examples', out.getvalue())
+        self.assertIn('x faster, markdown', out.getvalue())
+
+
+class CompressedTextTests(TestCase):
+    def test_text_is_stored_on_save(self):
+        remixable = Remixable(url=EXAMPLE_URL, markdown_content='# Case', html_content='')
+        self.assertEqual(remixable.markdown_content, '# Case')
+        self.assertIsNone(remixable.html_content)
+        self.assertEqual(ContentBlob.objects.count(), 0)
+
+        remixable.save()
+        remixable.refresh_from_db()
+        self.assertEqual((remixable.markdown_content, remixable.html_blob_id), ('# Case', None))
+        self.assertEqual(ContentBlob.objects.count(), 1)
+
+    def test_failed_save_leaves_no_blob(self):
+        Remixable.objects.create(url=EXAMPLE_URL)
+        with self.assertRaises(IntegrityError):
+            Remixable.objects.create(url=EXAMPLE_URL, markdown_content='# Duplicate')
+        self.assertEqual(ContentBlob.objects.count(), 0)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.entries = [
+            OutboxEntry.objects.create(model=model, object_id=i, action='upsert')
+            for i, model in enumerate(['remixable', 'post', 'remixable', 'remixable', 'remixable'])
+        ]
+
+    def ids(self, batches) -> list:
+        return [[entry.object_id for entry in batch] for batch in batches]
+
+    def test_batches_arrive_in_order_filtered_by_model(self):
+        self.assertEqual(self.ids(consume('t', models=('remixable',), batch_size=2)), [[0], [2, 3], [4]])
+        self.assertEqual(OutboxCursor.objects.get(target='t').position, self.entries[-1].id)
+        self.assertEqual(list(consume('t')), [])
+
+    def test_a_batch_is_delivered_again_if_the_consumer_raises_or_stops(self):
+        with self.assertRaises(RuntimeError):
+            for _ in consume('t', batch_size=2):
+                raise RuntimeError('export failed')
+        self.assertEqual(OutboxCursor.objects.get(target='t').position, 0)
+
+        for batch in consume('t', batch_size=2):
+            if batch[0].object_id == 2:
+                break
+        # The first batch was acknowledged by asking for the second, which is redelivered
+        self.assertEqual(self.ids(consume('t', batch_size=2)), [[2, 3], [4]])
+
+    def test_compaction_keeps_entries_a_cursor_has_not_reached(self):
+        self.assertEqual(compact_outbox(), 0)
+        acknowledge('airtable', self.entries[3].id)
+        acknowledge('search', self.entries[1].id)
+        acknowledge('search', self.entries[0].id)  # Cursors never move back
+        self.assertEqual(compact_outbox(), 2)
+        self.assertEqual(list(OutboxEntry.objects.values_list('object_id', flat=True)), [2, 3, 4])
+
+
+class FakeAirtableTable:
+    """pyairtable Table recording each write request; the calls numbered in fail_calls raise."""
+
+    def __init__(self, fail_calls=()):
+        self.fail_calls = set(fail_calls)
+        self.requests = []
+
+    def _record(self, action, records):
+        self.requests.append((action, [fields['video_url'] for fields in records]))
+        if len(self.requests) in self.fail_calls:
+            raise ConnectionError('Airtable unavailable')
+        return [{'id': f"rec-{fields['video_url']}", 'fields': fields} for fields in records]
+
+    def batch_create(self, records):
+        return self._record('create', records)
+
+    def batch_upsert(self, records, key_fields):
+        return {'records': self._record('upsert', [record['fields'] for record in records])}
+
+    def iterate(self, fields):
+        return iter([])
+
+
+class AirtableSyncTests(TestCase):
+    def setUp(self):
+        for i in range(23):
+            Remixable.objects.create(url=f'https://example.com/{i:02}', remixed_as=f'Post {i}', markdown_content=f'# {i}')
+
+    def sync(self, table, full=False):
+        with mock.patch('core.scrapers.Api', return_value=SimpleNamespace(table=lambda base, table_id: table)), \
+                mock.patch('core.scrapers.AIRTABLE_REQUEST_INTERVAL', 0):
+            return scrapers.sync_remixables_to_airtable(full=full)
+
+    def test_writes_in_tens_and_marks_only_synced_records(self):
+        table = FakeAirtableTable(fail_calls={2})
+        with self.assertLogs('core.scrapers', level='ERROR'):
+            summary = self.sync(table)
+        self.assertEqual([len(urls) for _, urls in table.requests], [10, 10, 3])
+        self.assertEqual((summary['created'], summary['failed']), (13, 10))
+        failed = set(table.requests[1][1])
+        synced = Remixable.objects.exclude(airtable_hash__isnull=True)
+        self.assertEqual(set(synced.values_list('url', flat=True)), {f'https://example.com/{i:02}' for i in range(23)} - failed)
+
+        # The failed chunk is retried and nothing else is sent
+        table = FakeAirtableTable()
+        summary = self.sync(table)
+        self.assertEqual(table.requests, [('create', sorted(failed))])
+
+    def test_unchanged_records_are_skipped(self):
+        self.sync(FakeAirtableTable())
+        table = FakeAirtableTable()
+        self.assertEqual(self.sync(table)['changed'], 0)
+        self.assertEqual(table.requests, [])
+
+        Remixable.objects.filter(url='https://example.com/05').update(remixed_as='Edited post')
+        self.sync(table)
+        self.assertEqual(table.requests, [('upsert', ['https://example.com/05'])])
+
+
+class RelevanceFilterTests(TestCase):
+    def test_reject_threshold_loses_at_most_the_allowed_share_of_relevant_stories(self):
+        y = np.array([1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0], dtype=np.float32)
+        probabilities = np.array([0.05, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.01, 0.1])
+        self.assertEqual(choose_reject_threshold(y, probabilities, target_recall=0.8), 0.3)
+        self.assertEqual(evaluate(y, probabilities, 0.3)['relevant_lost'], 2)
+        self.assertEqual(choose_reject_threshold(y, probabilities, target_recall=1.0), 0.05)
+
+    def test_training_keeps_held_out_recall_at_the_target(self):
+        relevant = ['crowd workers label training data', 'annotation teams review speech recordings',
+                    'data labelling vendors hire annotators', 'human feedback improves language models']
+        off_topic = ['bank announces merger with rival', 'retailer reports quarterly earnings',
+                     'startup press release new office', 'football club signs striker']
+        examples = []
+        for i in range(400):
+            is_relevant = i % 3 == 0
+            topic = (relevant if is_relevant else off_topic)[i % 4]
+            # Some stories mix both vocabularies, so the classes aren't perfectly separable
+            other = (off_topic if is_relevant else relevant)[(i // 4) % 4] if i % 7 == 0 else ''
+            examples.append((f'story-{i}', topic, f'{other} report {i % 10}', 85 if is_relevant else 20))
+
+        model = train(examples, relevance_threshold=70, target_recall=0.9)
+        metrics = model.metrics
+        self.assertGreater(metrics['relevant'], 0)
+        allowed = math.floor(metrics['relevant'] * (1 - 0.9))
+        self.assertLessEqual(metrics['relevant_lost'], allowed)
+        self.assertGreaterEqual(metrics['recall'], 0.9)
+        self.assertGreater(metrics['llm_calls_saved'], 0.3)
+        self.assertEqual(model.should_reject([{'title': off_topic[1], 'description': ''}]), [True])
+
+
+class RetrievalTests(TempFilesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        index_patch = mock.patch.multiple('core.retrieval', _index=None, _index_mtime=None)
+        index_patch.start()
+        self.addCleanup(index_patch.stop)
+        self.pages = {}
+        for slug, title, content in [
+            ('lidar', 'Lidar annotation', 'We label lidar point clouds for autonomous driving.'),
+            ('audio', 'Audio transcription', 'Native speakers transcribe audio recordings.'),
+            ('surveys', 'Online surveys', 'Panels answer market research surveys.'),
+        ]:
+            page = SitemapURL(url=f'https://site.example/{slug}', title=title, meta_desc=f'{title} services')
+            page.content = content
+            page.save()
+            self.pages[slug] = page.pk
+
+    def test_shortlist_ranks_the_matching_page_first(self):
+        shortlist = retrieval.shortlist_pages('Carmakers need labelled lidar data for self-driving', k=2)
+        self.assertEqual(shortlist[0], self.pages['lidar'])
+        self.assertTrue((self.tmp / 'sitemap_index.npz').exists())
+
+    def test_update_retokenizes_changed_pages_and_other_processes_reload_the_file(self):
+        first = retrieval.get_sitemap_index()
+        page = SitemapURL.objects.get(pk=self.pages['surveys'])
+        page.content = 'Panels answer market research surveys about electric scooters.'
+        page.save()
+
+        index, retokenized = retrieval.build_sitemap_index(first)
+        self.assertEqual(retokenized, 1)
+        index.save(settings.RETRIEVAL_INDEX_PATH)
+        # Another process rebuilt the file: the cached index is replaced by the one on disk
+        os.utime(settings.RETRIEVAL_INDEX_PATH, (1, 1))
+        reloaded = retrieval.get_sitemap_index()
+        self.assertIsNot(reloaded, first)
+        self.assertEqual([doc_id for doc_id, _ in reloaded.search('scooters', 3)], [self.pages['surveys']])
+
+
+class DigestTests(TestCase):
+    FOOTER = 'Copyright 2026 Example Ltd, all rights reserved across every region.'
+    NAV = 'Home Services Industries About Us Contact Careers'
+
+    def add_page(self, slug, body):
+        page = SitemapURL(url=f'https://site.example/{slug}', title=slug.title(), meta_desc=f'About {slug}')
+        page.content = f'{self.NAV}\n{body}\n{self.FOOTER}'
+        page.save()
+        return page
+
+    def test_boilerplate_repeated_across_pages_is_dropped(self):
+        pages = [
+            self.add_page(slug, f'Our {slug} team handles thousands of {slug} projects every single month.')
+            for slug in ('lidar', 'audio', 'surveys', 'search')
+        ]
+        self.assertEqual(update_page_digests(), 4)
+        self.assertEqual(update_page_digests(), 0)
+        pages[0].refresh_from_db()
+        self.assertEqual(pages[0].digest, 'Our lidar team handles thousands of lidar projects every single month.')
+
+    def test_short_page_keeps_all_its_text_and_stale_digests_are_rebuilt(self):
+        self.assertEqual(make_digest('About', None, 'We are a small team.\nSay hello any time you like.'),
+                         'We are a small team. Say hello any time you like.')
+        # Nothing but chrome: the digest is empty rather than made up
+        self.assertEqual(make_digest('Menu', None, 'Home\nAbout'), '')
+
+        page = self.add_page('lidar', 'Our lidar team labels point clouds for carmakers in Europe.')
+        page.digest, page.digest_hash = 'Outdated digest', 'stale'
+        self.assertIn('Our lidar team labels point clouds', page_digest(page))
+
+    def test_long_page_is_cut_to_its_most_topical_sentences(self):
+        content = '\n'.join([
+            'Our office moved to a bigger building near the river last spring.',
+            'Lidar annotation teams label every point cloud frame for autonomous vehicles.',
+            'The summer party had a barbecue, a quiz and a band playing covers.',
+            'Autonomous vehicles need lidar annotation that is consistent across sensors.',
+            'Several colleagues ran the city marathon for a local charity.',
+            'Our newsletter shares recipes, book tips and photos from team trips.',
+        ])
+        digest = make_digest('Lidar annotation', 'Autonomous vehicles', content, max_chars=160)
+        self.assertLessEqual(len(digest), 160)
+        self.assertEqual(digest, 'Lidar annotation teams label every point cloud frame for autonomous vehicles. '
+                                 'Autonomous vehicles need lidar annotation that is consistent across sensors.')
+
+
+def png_bytes(width: int, height: int, color: str = 'teal') -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class PosterImageTests(TempFilesMixin, TestCase):
+    def test_variants_are_rendered_at_each_width_up_to_the_original(self):
+        from PIL import Image
+
+        data = png_bytes(800, 400)
+        poster = save_poster(' Ship it ', [data[:100], data[100:]])
+        self.assertEqual((poster.poster_text, poster.width, poster.height), ('Ship it', 800, 400))
+        self.assertEqual(sorted(poster.variants), [f'{w}.{ext}' for w in (320, 640, 800) for ext in ('jpeg', 'webp')])
+        with poster.image.storage.open(poster.variants['320.webp']) as f, Image.open(f) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (320, 160)))
+        with poster.image.storage.open(poster.variants['800.jpeg']) as f, Image.open(f) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (800, 400)))
+
+    def test_identical_images_are_stored_once(self):
+        first = save_poster('Ship it', [png_bytes(400, 200)])
+        again = save_poster('Launch day', [png_bytes(400, 200)])
+        other = save_poster('Ship it', [png_bytes(400, 200, 'orange')])
+        self.assertEqual(again.pk, first.pk)
+        self.assertNotEqual(other.pk, first.pk)
+        self.assertEqual(PosterImage.objects.count(), 2)
+        self.assertEqual(len(list((self.tmp / 'media' / 'posters').iterdir())), 2 * (1 + 4))
+
+    def test_remixed_list_serves_webp_with_a_jpeg_fallback(self):
+        poster = save_poster('Ship it', [png_bytes(800, 400)])
+        Remixable.objects.create(url=EXAMPLE_URL, title='Case', remixed_as='Remixed post', poster=poster)
+        html = self.client.get('/remixed/').content.decode()
+        self.assertIn('<source type="image/webp" srcset="/media/posters/', html)
+        self.assertIn(f'{poster.variants["320.webp"]} 320w', html)
+        self.assertIn(f'src="/media/{poster.variants["640.jpeg"]}"', html)
+        self.assertIn('width="800" height="400"', html)
@@ -1,7 +1,7 @@
 from django.urls import path
 from django.urls import include
 from rest_framework.routers import DefaultRouter
-from .views import HomeView, PostListView, PostViewSet
+from .views import HomeView, PostListView, PostViewSet, SearchView, regenerate_stream
 
 app_name = 'core'
 
@@ -11,5 +11,8 @@ router.register(r'posts', PostViewSet)
 urlpatterns = [
     path('', HomeView.as_view(), name='home'),
     path('posts/', PostListView.as_view(), name='post_list'),
+    path('api/search/', SearchView.as_view(), name='search'),
+    path('api/posts/<int:pk>/regenerate/', regenerate_stream, {'kind': 'posts'}, name='regenerate_post'),
+    path('api/remixables/<int:pk>/regenerate/', regenerate_stream, {'kind': 'remixables'}, name='regenerate_remixable'),
     path('api/', include(router.urls)),
 ]
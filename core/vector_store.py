@@ -0,0 +1,363 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from logging import getLogger
+
+import numpy as np
+from django.conf import settings
+
+from .retrieval import tokenize
+
+logger = getLogger(__name__)
+
+HASHING_DIM = 1024
+
+
+def hashing_embed(texts: list, dim: int = HASHING_DIM) -> np.ndarray:
+    """
+    Local embedding: signed feature hashing of unigrams and bigrams with
+    sublinear term frequency, L2-normalized. Needs no model or API call.
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = tokenize(text)
+        features = {}
+        for feature in words + [f'{a} {b}' for a, b in zip(words, words[1:])]:
+            features[feature] = features.get(feature, 0) + 1
+        for feature, count in features.items():
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'big')
+            sign = 1.0 if value >> 63 else -1.0
+            matrix[row, value % dim] += sign * (1 + np.log(count))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def azure_embed(texts: list) -> np.ndarray:
+    from .tasks import client
+
+    response = client.embeddings.create(model=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT, input=texts)
+    matrix = np.array([item.embedding for item in response.data], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def current_embedder() -> tuple:
+    """(name, embed function) for the configured embedding backend."""
+    if settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT:
+        return f"azure:{settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT}", azure_embed
+    return f"hashing:{HASHING_DIM}", hashing_embed
+
+
+class VectorStore:
+    """
+    On-disk store of L2-normalized float32 vectors keyed by string, e.g. a model's primary key.
+
+    `<name>.<generation>.f32` holds the raw row-major matrix and is memory-mapped
+    read-only for search, so every process shares the OS page cache instead of
+    loading a copy. `<name>.json` names the matrix file, maps keys to rows and
+    records the content hash each vector was built from; it is replaced atomically
+    after the matrix is written, so readers never see rows they can't map.
+    Deleted rows are zeroed and reused, and the matrix is compacted into a new
+    generation once more than a quarter of it is free. Rebuilds and compactions
+    never touch the file the current meta points at, so it stays valid until the
+    new meta replaces it.
+    """
+
+    def __init__(self, directory, name: str):
+        self.directory = str(directory)
+        self.name = name
+        self.meta_path = os.path.join(self.directory, f'{name}.json')
+        self.lock_path = os.path.join(self.directory, f'{name}.lock')
+        self._version = None
+        self._meta = None
+        self._matrix = None
+        self._row_keys = None
+        self._reader_lock = threading.Lock()
+
+    # Metadata and mapping
+
+    def _empty_meta(self, embedder: str, dim: int, generation: int = 0) -> dict:
+        return {'embedder': embedder, 'dim': dim, 'rows': 0, 'entries': {}, 'free': [], 'generation': generation}
+
+    def _vectors_path(self, meta: dict) -> str:
+        # Stores written before generations were introduced have no number in the file name
+        if 'generation' not in meta:
+            return os.path.join(self.directory, f'{self.name}.f32')
+        return os.path.join(self.directory, f"{self.name}.{meta['generation']}.f32")
+
+    def _next_generation(self, meta: dict | None) -> int:
+        return meta.get('generation', 0) + 1 if meta else 0
+
+    def _remove_superseded(self, old_path: str | None, meta: dict):
+        """Delete the previous generation once meta points past it. Open mappings keep their data."""
+        if old_path is not None and old_path != self._vectors_path(meta):
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+
+    def _read_meta(self) -> dict | None:
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def _write_meta(self, meta: dict):
+        tmp_path = f'{self.meta_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _snapshot(self) -> tuple:
+        """(meta, read-only matrix, key per row), remapped whenever a writer has published changes."""
+        with self._reader_lock:
+            while True:
+                try:
+                    stat = os.stat(self.meta_path)
+                    version = (stat.st_ino, stat.st_mtime_ns)
+                except FileNotFoundError:
+                    version = None
+                if version == self._version:
+                    break
+                meta = self._read_meta()
+                matrix = None
+                row_keys = None
+                if meta and meta['rows']:
+                    try:
+                        matrix = np.memmap(self._vectors_path(meta), dtype=np.float32, mode='r',
+                                           shape=(meta['rows'], meta['dim']))
+                    except FileNotFoundError:
+                        # A writer published a new generation after we read meta: read it again
+                        continue
+                    row_keys = np.full(meta['rows'], None, dtype=object)
+                    for key, entry in meta['entries'].items():
+                        row_keys[entry['row']] = key
+                self._meta, self._matrix, self._row_keys, self._version = meta, matrix, row_keys, version
+                break
+            return self._meta, self._matrix, self._row_keys
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Reads
+
+    def hashes(self) -> dict:
+        meta, _, _ = self._snapshot()
+        return {key: entry['hash'] for key, entry in (meta or {}).get('entries', {}).items()}
+
+    def needs_rebuild(self, embedder: str) -> bool:
+        """Whether the stored vectors come from a different embedder, so upserting rebuilds the store."""
+        meta, _, _ = self._snapshot()
+        return meta is not None and meta['embedder'] != embedder
+
+    def get(self, key: str) -> np.ndarray | None:
+        meta, matrix, _ = self._snapshot()
+        entry = meta and meta['entries'].get(str(key))
+        if entry is None or matrix is None:
+            return None
+        return np.array(matrix[entry['row']])
+
+    def __len__(self):
+        meta, _, _ = self._snapshot()
+        return len(meta['entries']) if meta else 0
+
+    def search(self, vector: np.ndarray, k: int) -> list:
+        """Top-k (key, cosine similarity) pairs, best first."""
+        meta, matrix, row_keys = self._snapshot()
+        if matrix is None or not meta['entries'] or vector.shape[-1] != meta['dim']:
+            return []
+        # One pass over the mapped matrix; free rows are excluded rather than copied around
+        scores = matrix @ vector.astype(np.float32)
+        scores[np.asarray(meta['free'], dtype=np.int64)] = -np.inf
+        k = min(k, len(meta['entries']))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(row_keys[i], float(scores[i])) for i in top]
+
+    # Writes
+
+    def upsert(self, items: list, embed=None, embedder: str = None) -> int:
+        """
+        Add or update (key, content_hash, text) items. Only items whose hash changed
+        are embedded. Returns the number of vectors written.
+        """
+        if embed is None:
+            embedder, embed = current_embedder()
+        with self._write_lock():
+            meta = old_meta = self._read_meta()
+            if meta is not None and meta['embedder'] != embedder:
+                logger.info(f"Vector store {self.name}: embedder changed to {embedder}, rebuilding")
+                meta = None
+            entries = meta['entries'] if meta else {}
+            changed = [
+                (str(key), content_hash, text) for key, content_hash, text in items
+                if entries.get(str(key), {}).get('hash') != content_hash
+            ]
+            if not changed:
+                return 0
+
+            vectors = np.concatenate([
+                embed([text for _, _, text in changed[i:i + 256]])
+                for i in range(0, len(changed), 256)
+            ])
+            if meta is None:
+                # A new generation: readers keep using the old file until the new meta is published
+                meta = self._empty_meta(embedder, vectors.shape[1], self._next_generation(old_meta))
+                open(self._vectors_path(meta), 'wb').close()
+            vectors_path = self._vectors_path(meta)
+
+            appended = []
+            in_place = []
+            for (key, content_hash, _), vector in zip(changed, vectors):
+                entry = meta['entries'].get(key)
+                if entry is not None:
+                    row = entry['row']
+                    in_place.append((row, vector))
+                elif meta['free']:
+                    row = meta['free'].pop()
+                    in_place.append((row, vector))
+                else:
+                    row = meta['rows'] + len(appended)
+                    appended.append(vector)
+                meta['entries'][key] = {'row': row, 'hash': content_hash}
+
+            if in_place:
+                matrix = np.memmap(vectors_path, dtype=np.float32, mode='r+', shape=(meta['rows'], meta['dim']))
+                for row, vector in in_place:
+                    matrix[row] = vector
+                matrix.flush()
+                del matrix
+            if appended:
+                with open(vectors_path, 'ab') as f:
+                    f.write(np.asarray(appended, dtype=np.float32).tobytes())
+                meta['rows'] += len(appended)
+            self._write_meta(meta)
+            self._remove_superseded(old_meta and self._vectors_path(old_meta), meta)
+        return len(changed)
+
+    def delete(self, keys) -> int:
+        """Remove keys; their rows are zeroed and reused by later upserts."""
+        with self._write_lock():
+            meta = self._read_meta()
+            if meta is None:
+                return 0
+            removed = [meta['entries'].pop(str(key)) for key in keys if str(key) in meta['entries']]
+            if not removed:
+                return 0
+            old_path = self._vectors_path(meta)
+            matrix = np.memmap(old_path, dtype=np.float32, mode='r+', shape=(meta['rows'], meta['dim']))
+            for entry in removed:
+                matrix[entry['row']] = 0
+                meta['free'].append(entry['row'])
+            matrix.flush()
+            del matrix
+            if len(meta['free']) > meta['rows'] / 4:
+                meta = self._compact(meta)
+            self._write_meta(meta)
+            self._remove_superseded(old_path, meta)
+        return len(removed)
+
+    def _compact(self, meta: dict) -> dict:
+        """
+        Copy the live rows into the next generation's file. The caller publishes the
+        returned meta, which is the only point where readers switch files.
+        """
+        matrix = np.memmap(self._vectors_path(meta), dtype=np.float32, mode='r', shape=(meta['rows'], meta['dim']))
+        keys = list(meta['entries'])
+        rows = [meta['entries'][key]['row'] for key in keys]
+        compacted = {**meta, 'generation': self._next_generation(meta), 'free': [], 'rows': len(keys)}
+        compacted['entries'] = {key: {**meta['entries'][key], 'row': new_row} for new_row, key in enumerate(keys)}
+        with open(self._vectors_path(compacted), 'wb') as f:
+            f.write(np.asarray(matrix[rows], dtype=np.float32).tobytes())
+        del matrix
+        return compacted
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(name: str) -> VectorStore:
+    with _stores_lock:
+        if name not in _stores:
+            _stores[name] = VectorStore(settings.VECTOR_STORE_DIR, name)
+        return _stores[name]
+
+
+def embed_query(text: str) -> np.ndarray:
+    _, embed = current_embedder()
+    return embed([text])[0]
+
+
+PAGE_TEXT_CHARS = 4000
+
+
+def _page_text(title: str | None, meta_desc: str | None, content: str | None) -> str:
+    return f"{title or ''}\n{meta_desc or ''}\n{(content or '')[:PAGE_TEXT_CHARS]}"
+
+
+def sync_sitemap_vectors() -> tuple:
+    """
+    Bring the sitemap store in line with matchable SitemapURL rows, embedding only
+    pages whose text changed. Returns (written, deleted).
+    """
+    from .blobs import decompress
+    from .retrieval import matchable_pages, page_hash
+
+    store = get_vector_store('sitemap')
+    # With a new embedder upsert starts an empty store, so every page is embedded again
+    stored = {} if store.needs_rebuild(current_embedder()[0]) else store.hashes()
+    wanted = set()
+    changed = []
+    rows = matchable_pages().values_list('id', 'title', 'meta_desc', 'content_blob__data')
+    for page_id, title, meta_desc, data in rows.iterator(chunk_size=500):
+        content = decompress(data)
+        key = str(page_id)
+        wanted.add(key)
+        content_hash = page_hash(title, meta_desc, content)
+        if stored.get(key) != content_hash:
+            changed.append((key, content_hash, _page_text(title, meta_desc, content)))
+    deleted = store.delete([key for key in stored if key not in wanted])
+    written = store.upsert(changed)
+    logger.info(f"Sitemap vectors: {written} written, {deleted} deleted, {len(store)} total")
+    return written, deleted
+
+
+def story_text(title: str | None, description: str | None) -> str:
+    return f"{title or ''}\n{description or ''}"
+
+
+def sync_story_vectors(stories: list) -> int:
+    """
+    Embed and store the given Story rows. If the embedder changed, every story is
+    embedded again, since upsert rebuilds the store from only the items it's given.
+    """
+    store = get_vector_store('stories')
+    if store.needs_rebuild(current_embedder()[0]):
+        from .models import Story
+
+        stories = Story.objects.only('id', 'title', 'description').iterator(chunk_size=500)
+    items = []
+    for story in stories:
+        text = story_text(story.title, story.description)
+        items.append((story.pk, hashlib.sha1(text.encode('utf-8')).hexdigest(), text))
+    return store.upsert(items)
+
+
+def story_vector(story) -> np.ndarray:
+    """The stored vector for a Story, embedding it on the fly if it isn't stored yet."""
+    vector = get_vector_store('stories').get(story.pk)
+    if vector is None:
+        vector = embed_query(story_text(story.title, story.description))
+    return vector
@@ -1,9 +1,19 @@
+import json
+from logging import getLogger
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseForbidden, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from django.views.generic import ListView
-from .models import Post, Story, Remixable
-from rest_framework import viewsets
+from .models import Post, Story, Remixable, SitemapURL
+from .search import SearchResults
+from rest_framework import generics, viewsets
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
+
+logger = getLogger(__name__)
 
 # First, create a serializer for your Post model
 class PostSerializer(serializers.ModelSerializer):
@@ -20,6 +30,64 @@ class PostViewSet(viewsets.ModelViewSet):
     pagination_class = PageNumberPagination
     page_size = 20
 
+class SearchResultSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+
+class StorySearchSerializer(SearchResultSerializer):
+    class Meta:
+        model = Story
+        fields = ['id', 'title', 'description', 'link', 'pubDate', 'relevance_score', 'rank', 'snippet']
+
+
+class SitemapURLSearchSerializer(SearchResultSerializer):
+    class Meta:
+        model = SitemapURL
+        fields = ['id', 'url', 'title', 'meta_desc', 'removed_at', 'rank', 'snippet']
+
+
+class RemixableSearchSerializer(SearchResultSerializer):
+    class Meta:
+        model = Remixable
+        fields = ['id', 'url', 'title', 'is_video', 'rank', 'snippet']
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SearchView(generics.ListAPIView):
+    """
+    Ranked full-text search: /api/search/?q=<text>&type=stories|pages|remixables.
+    All words must match; add any=1 to match any of them.
+    """
+    pagination_class = SearchPagination
+    serializers_by_type = {
+        'stories': StorySearchSerializer,
+        'pages': SitemapURLSearchSerializer,
+        'remixables': RemixableSearchSerializer,
+    }
+
+    def get_search_type(self):
+        search_type = self.request.query_params.get('type', 'stories')
+        if search_type not in self.serializers_by_type:
+            raise ValidationError({'type': f"Must be one of: {', '.join(self.serializers_by_type)}"})
+        return search_type
+
+    def get_serializer_class(self):
+        return self.serializers_by_type[self.get_search_type()]
+
+    def get_queryset(self):
+        text = self.request.query_params.get('q', '')
+        if not text.strip():
+            raise ValidationError({'q': 'This query parameter is required.'})
+        match_any = self.request.query_params.get('any') in ('1', 'true')
+        return SearchResults(self.get_search_type(), text, match_any)
+
+
 class HomeView(ListView):
     model = Story
     template_name = 'core/home.html'
@@ -35,7 +103,75 @@ class PostListView(ListView):
     paginate_by = 20
 
 def remixed_list(request):
-    remixed = Remixable.objects.exclude(remixed_as__isnull=True)
+    remixed = Remixable.objects.exclude(remixed_as__isnull=True).select_related('poster')
     return render(request, 'core/remixed_list.html', {'remixed': remixed})
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _regeneration(kind: str, pk: int) -> tuple:
+    """
+    (generator of text deltas, function saving the final text) for the object to regenerate.
+    Everything the prompt needs from the database is read here, so the generator only
+    reads the provider's stream.
+    """
+    from .tasks import post_content_params, stream_post_content, stream_post_for_remixable, url_to_source_name
+
+    if kind == 'posts':
+        post = get_object_or_404(Post.objects.select_related('story', 'sitemap_url'), pk=pk)
+
+        def save(content):
+            post.content = content
+            post.save(update_fields=['content', 'updated_at'])
+        return stream_post_content(post_content_params(post.story, post.sitemap_url)), save
+
+    remixable = get_object_or_404(Remixable, pk=pk)
+
+    def save(content):
+        remixable.remixed_as = content
+        remixable.save(update_fields=['remixed_as', 'updated_at'])
+    return stream_post_for_remixable(remixable.markdown_content or '', url_to_source_name(remixable.url)), save
+
+
+@require_GET
+async def regenerate_stream(request, kind, pk):
+    """
+    Regenerate a Post's or Remixable's text and stream it as server-sent events:
+    a `delta` event per piece of text, then `done` with the saved text, or `error`.
+    Staff only: it overwrites the saved text and pays for a generation. EventSource
+    can only send GET, so the session cookie is what authenticates it.
+    """
+    user = await request.auser()
+    if not user.is_staff:
+        return HttpResponseForbidden('Staff login required')
+    deltas, save = await sync_to_async(_regeneration)(kind, pk)
+
+    async def events():
+        parts = []
+        try:
+            while True:
+                # The provider SDKs are blocking, so each read runs in a worker thread
+                delta = await sync_to_async(next, thread_sensitive=False)(deltas, None)
+                if delta is None:
+                    break
+                parts.append(delta)
+                yield _sse('delta', {'text': delta})
+            content = ''.join(parts)
+            if not content.strip():
+                # Keep the existing text rather than blanking it
+                yield _sse('error', {'error': 'No text was generated, nothing saved'})
+                return
+            await sync_to_async(save)(content)
+            yield _sse('done', {'id': pk, 'content': content})
+        except Exception as e:
+            logger.error(f"Error regenerating {kind} {pk}: {str(e)}")
+            yield _sse('error', {'error': str(e)})
+        finally:
+            await sync_to_async(deltas.close, thread_sensitive=False)()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -135,4 +135,39 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = Path('/persistent/media') if os.environ.get('CAPROVER') else BASE_DIR / 'media'
 
 # Production URL for media files
-BASE_URL = os.getenv('BASE_URL', 'https://ainews.apps.innermaps.org')
\ No newline at end of file
+BASE_URL = os.getenv('BASE_URL', 'https://ainews.apps.innermaps.org')
+
+# LLM response cache (see core/llm_cache.py)
+LLM_CACHE_PATH = Path('/persistent/llm_cache.sqlite3') if os.environ.get('CAPROVER') else BASE_DIR / 'llm_cache.sqlite3'
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 60 * 60 * 24 * 30))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 50000))
+# Call sites that opt in to caching; set LLM_CACHE_SITES='' to disable. The default covers
+# only deterministic scoring and matching. Generation sites (post_content, remixable_post,
+# poster_text) sample at temperature 0.7, so caching them makes a regenerate return the same text
+LLM_CACHE_SITES = {
+    site.strip()
+    for site in os.getenv(
+        'LLM_CACHE_SITES',
+        'prompt_openai,relevance_score,match_page'
+    ).split(',')
+    if site.strip()
+}
+
+# Local relevance pre-filter (see core/relevance_filter.py), trained with `manage.py train_relevance_filter`
+RELEVANCE_FILTER_PATH = Path('/persistent/relevance_filter.json') if os.environ.get('CAPROVER') else BASE_DIR / 'relevance_filter.json'
+RELEVANCE_FILTER_ENABLED = os.getenv('RELEVANCE_FILTER_ENABLED', '1') == '1'
+# Share of pre-filter rejects still sent to the LLM, so the filter's misses keep being labelled
+RELEVANCE_FILTER_AUDIT_RATE = float(os.getenv('RELEVANCE_FILTER_AUDIT_RATE', '0.05'))
+
+# Local BM25 index used to shortlist sitemap pages before LLM matching (see core/retrieval.py)
+RETRIEVAL_INDEX_PATH = Path('/persistent/sitemap_index.npz') if os.environ.get('CAPROVER') else BASE_DIR / 'sitemap_index.npz'
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', 20))
+# Size cap for the page extract used in post generation prompts (see core/digest.py)
+PAGE_DIGEST_MAX_CHARS = int(os.getenv('PAGE_DIGEST_MAX_CHARS', 3000))
+
+# Memory-mapped vector store for SitemapURL and Story rows (see core/vector_store.py)
+VECTOR_STORE_DIR = Path('/persistent/vectors') if os.environ.get('CAPROVER') else BASE_DIR / 'vectors'
+# Azure OpenAI embedding deployment; leave unset to use the local hashing embedder
+AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv('AZURE_OPENAI_EMBEDDING_DEPLOYMENT', '')
+# Global Batch deployment used for offline post generation (see core/batches.py)
+AZURE_OPENAI_BATCH_DEPLOYMENT = os.getenv('AZURE_OPENAI_BATCH_DEPLOYMENT', 'gpt4turbo')